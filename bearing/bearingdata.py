@@ -1,11 +1,21 @@
 from abc import abstractmethod
 import os
+import time
+import logging
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from re import sub
 import scipy.io as spio
-import pandas as pd
 import numpy as np
-from scipy import stats
 from .db import BearingDataFeature
+from .cache import XJTUBinaryCache, read_xjtu_csv
+from .features import time_features, FEATURE_NAMES
+from .wavecache import get_waveform_cache
+from .manifest import DatasetManifest
+from .catalog import BearingCatalog
+
+logger = logging.getLogger(__name__)
 
 class InvalidParamaterException(Exception):
     def __init__(self, *args: object) -> None:
@@ -22,11 +32,11 @@ class FaultFrequency:
         self.bpfi_rate = bpfi
         self.bpfo_rate = bpfo
         self.bsf_rate = bsf
-        self.tft_rate = ftf
+        self.ftf_rate = ftf
         self.rps = 0.0
     
     def clone(self):
-        return FaultFrequency(self.bpfi, self.bpfo, self.bsf, self.ftf)
+        return FaultFrequency(self.bpfi_rate, self.bpfo_rate, self.bsf_rate, self.ftf_rate).set_rps(self.rps)
     
     def set_rps(self, rps):
         self.rps = rps
@@ -41,7 +51,7 @@ class FaultFrequency:
         return self.bpfo_rate * self.rps
     
     @property
-    def tft(self):
+    def ftf(self):
         return self.ftf_rate * self.rps
     
     @property
@@ -49,7 +59,7 @@ class FaultFrequency:
         return self.bsf_rate * self.rps
     
     def __repr__(self) -> str:
-        return f"bpfi:{self.bpfi} bpfo:{self.bpfo} tft:{self.ftf} bsf:{self.bsf} rps:{self.rps}"
+        return f"bpfi:{self.bpfi} bpfo:{self.bpfo} ftf:{self.ftf} bsf:{self.bsf} rps:{self.rps}"
  
 
 class BearingData:
@@ -64,6 +74,7 @@ class BearingData:
         self.bsf_rate = 0.0
         self.faulty_part = 0
         self.feature_data = None
+        self.waveform_cache = None
         self._loaded = False
     
     def __repr__(self):
@@ -76,7 +87,7 @@ class BearingData:
             fault.append("ball")
         if self.cage_fault:
             fault.append("cage")
-        return f"{self.file_name} rps:{self.rps} sample_rate:{self.sample_rate} bpfi:{self.bpfi} bpfo:{self.bpfo} tft:{self.ftf} bsf:{self.bsf} fault:{'|'.join(fault)}" 
+        return f"{self.file_name} rps:{self.rps} sample_rate:{self.sample_rate} bpfi:{self.bpfi} bpfo:{self.bpfo} ftf:{self.ftf} bsf:{self.bsf} fault:{'|'.join(fault)}" 
     
     @property
     def data_file_path(self):
@@ -85,6 +96,20 @@ class BearingData:
     @property
     def file_name(self):
         return self.file_path
+
+    def file_identity(self, with_hash=False):
+        '''
+        返回源文件的(size, mtime, content_hash)， 用来判断文件是否发生变化
+        '''
+        st = os.stat(self.data_file_path)
+        content_hash = None
+        if with_hash:
+            h = hashlib.sha1()
+            with open(self.data_file_path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    h.update(block)
+            content_hash = h.hexdigest()
+        return st.st_size, st.st_mtime_ns, content_hash
     
     @property
     def bpfi(self):
@@ -129,6 +154,34 @@ class BearingData:
     def set_ftf_rate(self, ftf):
         self.ftf_rate = ftf
         return self
+
+    def set_waveform_cache(self, cache):
+        '''
+        默认使用get_waveform_cache()返回的共享缓存
+        '''
+        self.waveform_cache = cache
+        return self
+
+    def waveforms(self):
+        '''
+        返回 通道名 -> 数组 的字典，优先从波形缓存里取，缓存被淘汰之后重新读取文件
+        '''
+        cache = self.waveform_cache if self.waveform_cache is not None else get_waveform_cache()
+        return cache.get_or_load(self.data_file_path, self._read_waveforms)
+
+    def unload(self):
+        '''
+        从波形缓存中移除当前文件
+        '''
+        cache = self.waveform_cache if self.waveform_cache is not None else get_waveform_cache()
+        cache.discard(self.data_file_path)
+        self._loaded = False
+        return self
+
+    def _channel(self, name):
+        if not self._loaded:
+            return None
+        return self.waveforms().get(name)
     
     @property
     def outer_fault(self):
@@ -155,41 +208,48 @@ class BearingData:
         '''
         计算单通道数据特征
         '''
-        f = BearingDataFeature()
-        abs_data = np.abs(data)
-        f.mean = np.mean(abs_data)
-        f.peak = np.max(abs_data)
-        f.peakpeak = np.max(data) - np.min(data)
-        f.rms = np.sqrt(np.dot(data, data) / len(data))
-        f.root_square = (np.sum(np.sqrt(abs_data)) / len(abs_data)) ** 2
-        if f.rms > 0.000001:
-            f.peak_factor = f.peakpeak / f.rms
-        else:
-            f.peak_factor = 0.0
-        f.kurtosis_factor = stats.kurtosis(data)
-        f.skewness_factor = stats.skew(data)
-        f.pulse_factror = f.peak / f.mean
-        f.allowance_factor = f.peak / f.root_square
-        f.variance = np.var(data)
-        f.std_var = np.sqrt(f.variance)
-        return f
+        return self._to_features(time_features(data))[0]
+
+    def _to_features(self, matrix):
+        '''
+        把time_features返回的特征矩阵的每一行转成BearingDataFeature
+        '''
+        result = []
+        for row in matrix.tolist():
+            f = BearingDataFeature()
+            for name, value in zip(FEATURE_NAMES, row):
+                setattr(f, name, value)
+            result.append(f)
+        return result
 
     
     @abstractmethod
-    def load_data(self):
+    def _read_waveforms(self):
         pass
 
+    def load_data(self):
+        self.waveforms()
+        self._loaded = True
+        return self
+
 
 class XJTUBearingData(BearingData):
     """
     西交大的数据请访问
-    V和H两个pandas的数据
+    V和H两个numpy数组
     """
     def __init__(self, root, file_path, bearing_name):
         super().__init__(root, file_path)
-        self.data_H = None
-        self.data_V = None
         self.bearing_name = bearing_name
+        self.cache = None
+
+    @property
+    def data_H(self):
+        return self._channel("H")
+
+    @property
+    def data_V(self):
+        return self._channel("V")
     
     @property
     def H(self):
@@ -199,24 +259,27 @@ class XJTUBearingData(BearingData):
     def V(self):
         return self.data_V
 
-    def load_data(self):
-        if self._loaded:
-            return self
-        df = pd.read_csv(self.data_file_path)
-        df = df.rename(columns={"Horizontal_vibration_signals":"H", "Vertical_vibration_signals":"V"})
-        self.data_H = df.H
-        self.data_V = df.V
-        self._loaded = True
+    def set_cache(self, cache):
+        self.cache = cache
         return self
+
+    def _read_waveforms(self):
+        channels = None
+        if self.cache is not None:
+            channels = self.cache.lookup(self)
+        if channels is None:
+            channels = read_xjtu_csv(self.data_file_path)
+        return {"H": channels[0], "V": channels[1]}
     
     def calculate_features(self):
-        for d in ["H", "V"]:
-            data = getattr(self, d)
-            f = super(XJTUBearingData, self).calculate_features(data)
+        channels = ["H", "V"]
+        features = self._to_features(time_features(np.vstack([np.asarray(getattr(self, d)) for d in channels])))
+        file_idx = int(os.path.splitext(os.path.basename(self.file_name))[0])
+        for d, f in zip(channels, features):
             f.filename = self.file_name
             f.channel = d
             f.bearing_name = self.bearing_name
-            f.file_idx = int(os.path.splitext(os.path.basename(self.file_name))[0])
+            f.file_idx = file_idx
             yield f
 
 
@@ -229,10 +292,22 @@ class CWRUBearingData(BearingData):
     def __init__(self, root, file_path):
         super().__init__(root, file_path)
         self.fault_part_size = 0.0
-        self.data_de = None # driver end 
-        self.data_fe = None # fan end
-        self.data_ba = None # base
-        self.diretion_data = 0
+        self.direction_data = 0
+
+    @property
+    def data_de(self):
+        # driver end
+        return self._channel("de")
+
+    @property
+    def data_fe(self):
+        # fan end
+        return self._channel("fe")
+
+    @property
+    def data_ba(self):
+        # base
+        return self._channel("ba")
 
     @property
     def de(self):
@@ -253,54 +328,99 @@ class CWRUBearingData(BearingData):
     @property
     def direction(self):
         return self.direction_data
-    
-    def load_data(self):
-        if self._loaded:
-            return self
+
+    def _read_waveforms(self):
+        result = {}
         data = spio.loadmat(self.data_file_path)
         for (key, value) in data.items():
             if key.endswith("BA_time"):
-                self.data_ba = value
+                result["ba"] = value
             elif key.endswith("FE_time"):
-                self.data_fe = value
+                result["fe"] = value
             elif key.endswith("DE_time"):
-                self.data_de = value
+                result["de"] = value
             elif key.endswith("RPM"):
-                self.set_rps(int(value)/60.0)
-        name = os.path.basename(self.file_name)
-        prefix = None
-        if name.startswith("IR"):
-            self.set_fault_part(INNER_FAULT | self.faulty_part)
-            prefix = "IR"
-        elif name.startswith("B"):
-            self.set_fault_part(BALL_FAULT | self.faulty_part)
-            prefix = "B"
-        elif name.startswith("OR"):
-            self.set_fault_part(OUTER_FAULT | self.faulty_part)
-            prefix = "OR"
-        name = name[len(prefix):]
-        name = name.split("_")[0]
-        sects = name.split("@")
-        if len(sects) == 2:
-            self.direction = int(sects[1])
-        name = sects[0]
-        name = name.strip("0")
-        self.fault_part_size = int(name)
-        self._loaded = True
+                # 转速和波形一起缓存， 缓存命中的时候也能在load_data里恢复rps
+                result["rpm"] = value
+        return result
+    
+    def load_data(self):
+        if self._loaded:
+            return self
+        super().load_data()
+        rpm = self.waveforms().get("rpm")
+        if rpm is not None:
+            self.set_rps(int(np.ravel(rpm)[0])/60.0)
+        fault, size, direction = parse_cwru_file_name(self.file_name)
+        self.set_fault_part(fault | self.faulty_part)
+        if size is not None:
+            self.fault_part_size = size
+        if direction is not None:
+            self.direction_data = direction
         return self
 
 
+# 西储大学试验台的负载(马力) -> 电机转速(rpm)
+CWRU_LOAD_RPM = {0: 1797, 1: 1772, 2: 1750, 3: 1730}
+
+
+def parse_cwru_rps(file_name):
+    '''
+    从文件名末尾的负载得到rps， 例如OR007@6_0.mat为1797 / 60， 无法解析的时候返回nan
+    '''
+    load = os.path.splitext(os.path.basename(file_name))[0].rsplit("_", 1)[-1]
+    if not load.isdigit() or int(load) not in CWRU_LOAD_RPM:
+        return np.nan
+    return CWRU_LOAD_RPM[int(load)] / 60.0
+
+
+def parse_cwru_file_name(file_name):
+    '''
+    从西储大学的文件名解析故障类型，故障尺寸和方向, 例如OR007@6_0.mat
+    正常数据没有故障尺寸，没有的部分返回None
+    '''
+    name = os.path.basename(file_name)
+    prefix = None
+    fault = 0
+    if name.startswith("IR"):
+        fault = INNER_FAULT
+        prefix = "IR"
+    elif name.startswith("B"):
+        fault = BALL_FAULT
+        prefix = "B"
+    elif name.startswith("OR"):
+        fault = OUTER_FAULT
+        prefix = "OR"
+    if prefix is None:
+        return fault, None, None
+    name = name[len(prefix):]
+    name = name.split("_")[0]
+    sects = name.split("@")
+    direction = None
+    if len(sects) == 2:
+        direction = int(sects[1])
+    name = sects[0]
+    name = name.strip("0")
+    return fault, int(name), direction
+
+
 class XJTUData:
     '''
     西交数据集， 含有完整生命周期数据的数据集，含有不同的rps和不同的故障类型
     '''
-    def __init__(self, root_path="./data/xjtu_data"):
+    def __init__(self, root_path="./data/xjtu_data", cache_root=None, manifest_path=None):
         """
         西交大的数据， 一共有15个轴承数据， 
         每一个轴承的数据量各不相同, 少的100多个，多个上千个文件。 
         每个文件都是采样频率25.6K, 一共采样1.28S的数据
+        cache_root为二进制缓存目录，默认为root_path/.cache， 使用build_cache生成
+        manifest_path为文件清单的路径， 默认为root_path/.manifest.json
         """
         self.data = []
+        self.root_path = root_path
+        if cache_root is None:
+            cache_root = os.path.join(root_path, ".cache")
+        self.cache = XJTUBinaryCache(cache_root)
         self.folder2params = {
             "35Hz12kN/Bearing1_1": [35, OUTER_FAULT],
             "35Hz12kN/Bearing1_2": [35, OUTER_FAULT],
@@ -323,56 +443,215 @@ class XJTUData:
         self.bpfi_rate = 8 / 2.0 * (1 + 7.92 / 34.55)
         self.ftf_rate = 1.0 / 2.0 * (1 - 7.92 /34.55)
         self.bsf_rate = 34.55 / 7.92 * (1 - (7.92/ 34.55)**2)
+        if manifest_path is None:
+            manifest_path = os.path.join(root_path, ".manifest.json")
+        self.manifest = DatasetManifest(manifest_path)
         self.list_files(root_path)
 
     def list_files(self, root_path):
         for folder_name, v in self.folder2params.items():
+            try:
+                names = set(name for name, _, _ in self.manifest.list_folder(root_path, folder_name, [v, self.sample_rate]))
+            except FileNotFoundError:
+                names = set()
             index = 1
             files = []
-            while True:
-                filename = os.path.join(root_path, folder_name, f"{index}.csv")
-                if not os.path.exists(filename):
-                    break
-                data = XJTUBearingData(root_path, os.path.join(folder_name, f"{index}.csv"), folder_name.split("/")[1])
-                data.set_sample_rate(self.sample_rate)
-                data.set_rps(v)
-                data.set_bpfi_rate(self.bpfi_rate)
-                data.set_bpfo_rate(self.bpfo_rate)
-                data.set_ftf_rate(self.ftf_rate)
-                data.set_bsf_rate(self.bsf_rate)
-                files.append(data)
+            while f"{index}.csv" in names:
+                files.append(self._make_file(folder_name, f"{index}.csv"))
                 index += 1
             self.data.append(files)
+        self.manifest.save()
+
+    def _make_file(self, folder_name, file_name):
+        v = self.folder2params[folder_name]
+        data = XJTUBearingData(self.root_path, os.path.join(folder_name, file_name), folder_name.split("/")[1])
+        data.set_sample_rate(self.sample_rate)
+        data.set_rps(v[0])
+        data.set_fault_part(v[1])
+        data.set_bpfi_rate(self.bpfi_rate)
+        data.set_bpfo_rate(self.bpfo_rate)
+        data.set_ftf_rate(self.ftf_rate)
+        data.set_bsf_rate(self.bsf_rate)
+        data.set_cache(self.cache)
+        return data
+
+    def catalog(self):
+        '''
+        返回所有文件的BearingCatalog
+        '''
+        return BearingCatalog.from_xjtu(self)
+
+    def find_bearing(self, bearing):
+        '''
+        bearing可以是序号，轴承名(Bearing1_1)或者目录名(35Hz12kN/Bearing1_1)
+        '''
+        if isinstance(bearing, (int, np.integer)):
+            return self.data[bearing]
+        for folder_name, files in zip(self.folder2params.keys(), self.data):
+            if bearing == folder_name or bearing == folder_name.split("/")[1]:
+                return files
+        raise InvalidParamaterException(f"unknown bearing {bearing}")
+
+    def iter_signals(self, bearing, channels=("H", "V"), prefetch=4):
+        '''
+        按照file_idx顺序遍历一个轴承的全部文件，返回(bearing_file, 通道数 x 采样点的数组)
+        后台线程提前读取后面prefetch个文件， 读文件和调用方的计算同时进行，
+        同时最多只有prefetch + 1个文件的数据在内存里， 读取的数据不会放进波形缓存
+        '''
+        bearing_files = self.find_bearing(bearing)
+        channels = list(channels)
+        prefetch = max(1, prefetch)
+        pool = ThreadPoolExecutor(max_workers=prefetch)
+        pending = deque()
+        try:
+            for bearing_file in bearing_files:
+                pending.append((bearing_file, pool.submit(_read_channels, bearing_file, channels)))
+                if len(pending) > prefetch:
+                    done_file, future = pending.popleft()
+                    yield done_file, future.result()
+            while len(pending) > 0:
+                done_file, future = pending.popleft()
+                yield done_file, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
+            pool.shutdown(wait=False)
+
+    def build_cache(self, dtype=np.float64, rebuild=False):
+        '''
+        一次性把所有csv转换成二进制缓存, 已经有效的缓存会被跳过
+        '''
+        for folder_name, bearing in zip(self.folder2params.keys(), self.data):
+            files = [bearing_file.file_path for bearing_file in bearing]
+            if self.cache.build(self.root_path, folder_name, files, dtype, rebuild):
+                for bearing_file in bearing:
+                    bearing_file.unload()
     
-    def refresh_features(self, db):
-        features = []
+    def refresh_features(self, db, workers=None, executor="process", batch_size=50):
+        '''
+        计算所有文件的特征并写入数据库
+        workers大于1的时候使用进程池(executor="process")或者线程池(executor="thread")并行读取文件和计算特征，
+        只有当前线程写数据库，写入顺序和串行时一样按照轴承和file_idx排序
+        返回处理的文件数，特征数，耗时和吞吐量
+        '''
+        bearing_files = [bearing_file for bearing in self.data for bearing_file in bearing]
+        return self._write_features(db, bearing_files, workers, executor, batch_size)
+
+    def update_features(self, db, with_hash=False, workers=None, executor="process", batch_size=50):
+        '''
+        增量更新特征， 只计算新增或者发生变化的文件， 删除已经不存在的文件的特征
+        文件是否变化根据大小和修改时间判断， with_hash为True时大小或修改时间变化但是内容哈希相同的文件不会重新计算
+        '''
+        stored = db.list_source_files()
+        changed = []
+        unchanged_records = []
+        current = set()
         for bearing in self.data:
             for bearing_file in bearing:
-                bearing_file.load_data()
-                for feature in bearing_file.calculate_features():
-                   features.append(feature)
-                   if len(features) >= 50:
-                       db.add_features(features)
-                       features = []
-        if len(features) > 0:
-            db.add_features(features)
+                current.add(bearing_file.file_path)
+                old = stored.get(bearing_file.file_path)
+                size, mtime, _ = bearing_file.file_identity()
+                if old is not None and old[0] == size and old[1] == mtime:
+                    continue
+                if with_hash and old is not None and old[2] is not None:
+                    identity = bearing_file.file_identity(with_hash=True)
+                    if identity[2] == old[2]:
+                        unchanged_records.append((bearing_file.file_path, bearing_file.bearing_name) + identity)
+                        continue
+                changed.append(bearing_file)
+        removed = [filename for filename in stored.keys() if filename not in current]
+        db.delete_features(removed + [bearing_file.file_path for bearing_file in changed])
+        db.set_source_files(unchanged_records)
+        stats = self._write_features(db, changed, workers, executor, batch_size, with_hash)
+        stats["removed"] = len(removed)
+        return stats
+
+    def _write_features(self, db, bearing_files, workers, executor, batch_size, with_hash=False):
+        start = time.perf_counter()
+        if workers is None or workers <= 1:
+            results = map(_calculate_file_features, bearing_files, [with_hash] * len(bearing_files))
+            pool = None
+        else:
+            if executor == "process":
+                pool = ProcessPoolExecutor(max_workers=workers)
+            elif executor == "thread":
+                pool = ThreadPoolExecutor(max_workers=workers)
+            else:
+                raise InvalidParamaterException(f"unknown executor {executor}")
+            chunksize = max(1, len(bearing_files) // (workers * 16))
+            results = pool.map(_calculate_file_features, bearing_files, [with_hash] * len(bearing_files),
+                               chunksize=chunksize)
+        features = []
+        records = []
+        feature_count = 0
+        try:
+            for bearing_file, (identity, file_features) in zip(bearing_files, results):
+                features.extend(file_features)
+                records.append((bearing_file.file_path, bearing_file.bearing_name) + identity)
+                if len(features) >= batch_size:
+                    db.add_features(features)
+                    db.set_source_files(records)
+                    feature_count += len(features)
+                    features = []
+                    records = []
+            if len(features) > 0:
+                db.add_features(features)
+                feature_count += len(features)
+            db.set_source_files(records)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        elapsed = time.perf_counter() - start
+        stats = {
+            "files": len(bearing_files),
+            "features": feature_count,
+            "seconds": elapsed,
+            "files_per_second": len(bearing_files) / elapsed if elapsed > 0 else 0.0,
+        }
+        logger.info("refresh features: %d files, %d features in %.1fs (%.1f files/s)",
+                    stats["files"], stats["features"], stats["seconds"], stats["files_per_second"])
+        return stats
+
+
+def _read_channels(bearing_file, channels):
+    waveforms = bearing_file._read_waveforms()
+    return np.vstack([np.asarray(waveforms[c]) for c in channels])
+
+
+def _calculate_file_features(bearing_file, with_hash=False):
+    # 读取之前记录文件的(size, mtime, hash)， 读取和写入之间文件发生变化的时候， 下一次update_features会重新计算
+    # 计算完马上从波形缓存中移除， 每个进程最多只保留当前文件， 刷新结束后也不占用缓存
+    identity = bearing_file.file_identity(with_hash)
+    bearing_file.load_data()
+    try:
+        return identity, list(bearing_file.calculate_features())
+    finally:
+        bearing_file.unload()
 
 
 class CWRUData:
     '''
     西储大学数据集， 含有正常数据和异常数据，异常数据中含有不同类型的故障
     '''
-    def __init__(self, root_path="./data/cwru_data"):
+    def __init__(self, root_path="./data/cwru_data", manifest_path=None):
+        '''
+        manifest_path为文件清单的路径， 默认为root_path/.manifest.json
+        '''
+        self.root_path = root_path
         self.normal_data = []
         self.f12kde_data = []
         self.f48kde_data = []
         self.fe_data = []
+        self.folder_files = {}
         self.folder2samplerate =  {
                         "12KDriveEnd": [12 * 1000, (5.4152, 3.5848, 0.39828, 4.7135) , lambda x: self.f12kde_data.append(x)],
                         "48KDriveEnd": [48 * 1000, (5.4152, 3.5848, 0.39828, 4.713), lambda x: self.f48kde_data.append(x)],
                         "FanEnd":  [12 * 1000, (4.9469, 3.0530, 0.3817, 3.9874), lambda x: self.fe_data.append(x)],
                         "normal": [12 * 1000, (1, 1, 1, 1), lambda x: self.normal_data.append(x)] #normal data do not need fault frequency
                     }
+        if manifest_path is None:
+            manifest_path = os.path.join(root_path, ".manifest.json")
+        self.manifest = DatasetManifest(manifest_path)
         self.list_files(root_path)
 
     @property
@@ -391,18 +670,36 @@ class CWRUData:
     def normal(self):
         return self.normal_data
 
+    def _make_file(self, folder_name, file_name):
+        v = self.folder2samplerate[folder_name]
+        data = CWRUBearingData(self.root_path, os.path.join(folder_name, file_name))
+        data.set_sample_rate(v[0])
+        fault_freq_rate = v[1]
+        data.set_bpfi_rate(fault_freq_rate[0])
+        data.set_bpfo_rate(fault_freq_rate[1])
+        data.set_ftf_rate(fault_freq_rate[2])
+        data.set_bsf_rate(fault_freq_rate[3])
+        return data
+
+    def catalog(self):
+        '''
+        返回所有文件的BearingCatalog， 故障类型从文件名解析，rps由文件名中的负载(_0到_3)得到， 没有负载的为nan
+        '''
+        return BearingCatalog.from_cwru(self)
+
+    def file_names(self, folder_name):
+        '''
+        目录下按文件名排序的文件名列表
+        '''
+        return self.folder_files.get(folder_name, [])
+
     def list_files(self, root_path):
         for folder_name, v in self.folder2samplerate.items():
-            file_names = os.listdir(os.path.join(root_path,folder_name))
-            for file_name in file_names:
-                data = CWRUBearingData(root_path, os.path.join(folder_name, file_name))
-                data.set_sample_rate(v[0])
-                fault_freq_rate = v[1]
-                data.set_bpfi_rate(fault_freq_rate[0])
-                data.set_bpfo_rate(fault_freq_rate[1])
-                data.set_ftf_rate(fault_freq_rate[2])
-                data.set_bsf_rate(fault_freq_rate[3])
-                v[2](data)
+            files = self.manifest.list_folder(root_path, folder_name, [v[0], v[1]])
+            self.folder_files[folder_name] = [file_name for file_name, _, _ in files]
+            for file_name in self.folder_files[folder_name]:
+                v[2](self._make_file(folder_name, file_name))
+        self.manifest.save()
 
 
 def test():
@@ -0,0 +1,143 @@
+'''
+西交大数据的二进制缓存
+每个轴承的全部csv文件转换成一个 文件数 x 通道 x 采样点 的npy数组，
+读取时使用内存映射，直接返回numpy视图，避免每次都解析文本
+'''
+
+import os
+import json
+import numpy as np
+import pandas as pd
+
+
+XJTU_CHANNELS = ("H", "V")
+
+
+def read_xjtu_csv(file_path):
+    '''
+    读取西交大的csv文件，返回(H, V)两个通道的numpy数组， 和缓存的内存映射类型一致
+    '''
+    df = pd.read_csv(file_path)
+    df = df.rename(columns={"Horizontal_vibration_signals":"H", "Vertical_vibration_signals":"V"})
+    return df.H.to_numpy(), df.V.to_numpy()
+
+
+def _file_identity(file_path):
+    st = os.stat(file_path)
+    return st.st_size, st.st_mtime_ns
+
+
+class XJTUBinaryCache:
+    '''
+    cache_root下每个轴承目录对应两个文件:
+    <name>.npy 保存数据, <name>.json 保存每个csv文件的大小和修改时间，用来判断缓存是否过期
+    '''
+    def __init__(self, cache_root):
+        self.cache_root = cache_root
+        self._opened = {}
+
+    def __getstate__(self):
+        # 传给子进程的时候不带上已经打开的内存映射， 子进程自己重新打开
+        state = self.__dict__.copy()
+        state["_opened"] = {}
+        return state
+
+    def _cache_name(self, folder_name):
+        return folder_name.replace("/", "_").replace("\\", "_")
+
+    def data_path(self, folder_name):
+        return os.path.join(self.cache_root, self._cache_name(folder_name) + ".npy")
+
+    def index_path(self, folder_name):
+        return os.path.join(self.cache_root, self._cache_name(folder_name) + ".json")
+
+    def _open(self, folder_name):
+        if folder_name in self._opened:
+            return self._opened[folder_name]
+        result = None
+        data_path = self.data_path(folder_name)
+        index_path = self.index_path(folder_name)
+        if os.path.exists(data_path) and os.path.exists(index_path):
+            with open(index_path, "r") as f:
+                index = json.load(f)
+            data = np.load(data_path, mmap_mode="r")
+            result = (data, index["files"])
+            # 缓存不存在的时候不记住， 其他实例或者进程之后建立的缓存也能用上
+            self._opened[folder_name] = result
+        return result
+
+    def is_fresh(self, root, folder_name, files):
+        '''
+        files为该目录下按照顺序排列的相对路径, 缓存里的每个文件都没有变化才认为缓存有效
+        '''
+        opened = self._open(folder_name)
+        if opened is None:
+            return False
+        _, cached_files = opened
+        if len(cached_files) != len(files):
+            return False
+        for file_path, (cached_path, size, mtime) in zip(files, cached_files):
+            if file_path != cached_path:
+                return False
+            if _file_identity(os.path.join(root, file_path)) != (size, mtime):
+                return False
+        return True
+
+    def lookup(self, bearing_data):
+        '''
+        返回(H, V)两个内存映射的视图，缓存不存在或者文件已经改变的时候返回None
+        '''
+        folder_name = os.path.dirname(bearing_data.file_path)
+        opened = self._open(folder_name)
+        if opened is None:
+            return None
+        data, cached_files = opened
+        file_idx = int(os.path.splitext(os.path.basename(bearing_data.file_path))[0])
+        pos = file_idx - 1
+        if pos < 0 or pos >= len(cached_files):
+            return None
+        cached_path, size, mtime = cached_files[pos]
+        if cached_path != bearing_data.file_path or size < 0:
+            return None
+        try:
+            if _file_identity(bearing_data.data_file_path) != (size, mtime):
+                return None
+        except OSError:
+            return None
+        return data[pos, 0], data[pos, 1]
+
+    def build(self, root, folder_name, files, dtype=np.float64, rebuild=False):
+        '''
+        将一个轴承目录下的csv文件转换成二进制缓存，缓存有效并且rebuild为False的时候直接跳过
+        长度和第一个文件不一致的文件不会写入缓存，读取时会回退到csv
+        '''
+        if len(files) == 0:
+            return False
+        if not rebuild and self.is_fresh(root, folder_name, files):
+            return False
+        os.makedirs(self.cache_root, exist_ok=True)
+        self._opened.pop(folder_name, None)
+        data_path = self.data_path(folder_name)
+        index_path = self.index_path(folder_name)
+        tmp_path = data_path + ".tmp.npy"
+        out = None
+        cached_files = []
+        for pos, file_path in enumerate(files):
+            full_path = os.path.join(root, file_path)
+            size, mtime = _file_identity(full_path)
+            H, V = read_xjtu_csv(full_path)
+            if out is None:
+                out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype,
+                                                shape=(len(files), len(XJTU_CHANNELS), len(H)))
+            if len(H) != out.shape[2] or len(V) != out.shape[2]:
+                cached_files.append([file_path, -1, -1])
+                continue
+            out[pos, 0] = H
+            out[pos, 1] = V
+            cached_files.append([file_path, size, mtime])
+        out.flush()
+        del out
+        os.replace(tmp_path, data_path)
+        with open(index_path, "w") as f:
+            json.dump({"dtype": np.dtype(dtype).name, "files": cached_files}, f)
+        return True
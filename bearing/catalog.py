@@ -0,0 +1,133 @@
+'''
+轴承文件的列式目录
+每个文件的元数据(数据集，轴承名，file_idx，寿命比例，rps，采样频率，故障类型，故障频率系数)保存在一个numpy结构化数组里，
+筛选文件时直接对数组做向量化运算，只为选中的行创建BearingData对象
+'''
+
+import os
+import numpy as np
+
+
+CATALOG_DTYPE = np.dtype([
+    ("dataset", "U8"),
+    ("folder", "U64"),
+    ("file_name", "U64"),
+    ("bearing_name", "U32"),
+    ("file_idx", np.int32),
+    ("life_fraction", np.float64), # file_idx / 文件数， 西储大学的数据为nan
+    ("rps", np.float64), # 西储大学的数据由文件名中的负载得到， 没有负载的为nan
+    ("sample_rate", np.float64),
+    ("faulty_part", np.int32),
+    ("bpfi_rate", np.float64),
+    ("bpfo_rate", np.float64),
+    ("ftf_rate", np.float64),
+    ("bsf_rate", np.float64),
+])
+
+
+class BearingCatalog:
+    '''
+    records为CATALOG_DTYPE的结构化数组
+    factories为 数据集名 -> 根据(folder, file_name)创建BearingData的函数
+    '''
+    def __init__(self, records, factories):
+        self.records = records
+        self.factories = factories
+
+    @classmethod
+    def from_xjtu(cls, xjtu):
+        parts = []
+        for (folder_name, v), bearing in zip(xjtu.folder2params.items(), xjtu.data):
+            n = len(bearing)
+            part = np.zeros(n, dtype=CATALOG_DTYPE)
+            file_idx = np.arange(1, n + 1)
+            part["dataset"] = "xjtu"
+            part["folder"] = folder_name
+            part["file_name"] = [f"{i}.csv" for i in file_idx]
+            part["bearing_name"] = folder_name.split("/")[1]
+            part["file_idx"] = file_idx
+            part["life_fraction"] = file_idx / max(n, 1)
+            part["rps"] = v[0]
+            part["sample_rate"] = xjtu.sample_rate
+            part["faulty_part"] = v[1]
+            part["bpfi_rate"] = xjtu.bpfi_rate
+            part["bpfo_rate"] = xjtu.bpfo_rate
+            part["ftf_rate"] = xjtu.ftf_rate
+            part["bsf_rate"] = xjtu.bsf_rate
+            parts.append(part)
+        return cls(np.concatenate(parts) if parts else np.zeros(0, dtype=CATALOG_DTYPE),
+                   {"xjtu": xjtu._make_file})
+
+    @classmethod
+    def from_cwru(cls, cwru):
+        from .bearingdata import parse_cwru_file_name, parse_cwru_rps
+        rows = []
+        for folder_name, v in cwru.folder2samplerate.items():
+            for file_name in cwru.file_names(folder_name):
+                fault, _, _ = parse_cwru_file_name(file_name)
+                rows.append(("cwru", folder_name, file_name, os.path.splitext(file_name)[0], 0, np.nan,
+                             parse_cwru_rps(file_name), v[0], fault, v[1][0], v[1][1], v[1][2], v[1][3]))
+        return cls(np.array(rows, dtype=CATALOG_DTYPE), {"cwru": cwru._make_file})
+
+    @classmethod
+    def concat(cls, catalogs):
+        factories = {}
+        for catalog in catalogs:
+            factories.update(catalog.factories)
+        return cls(np.concatenate([catalog.records for catalog in catalogs]), factories)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, key):
+        '''
+        整数返回一行记录， 切片，序号数组或者布尔数组返回新的BearingCatalog
+        '''
+        if isinstance(key, (int, np.integer)):
+            return self.records[key]
+        return BearingCatalog(self.records[key], self.factories)
+
+    def mask(self, dataset=None, bearing_name=None, fault=None, rps=None, sample_rate=None, life=None):
+        '''
+        返回满足所有条件的布尔数组
+        bearing_name可以是一个名字或者列表
+        fault为故障类型的位组合, 含有其中任意一个故障的文件都会被选中, 0表示正常数据
+        life为(下限, 上限)， 闭区间
+        '''
+        result = np.ones(len(self.records), dtype=bool)
+        if dataset is not None:
+            result &= self.records["dataset"] == dataset
+        if bearing_name is not None:
+            result &= np.isin(self.records["bearing_name"], np.atleast_1d(bearing_name))
+        if fault is not None:
+            if fault == 0:
+                result &= self.records["faulty_part"] == 0
+            else:
+                result &= (self.records["faulty_part"] & fault) != 0
+        if rps is not None:
+            result &= np.isclose(self.records["rps"], rps)
+        if sample_rate is not None:
+            result &= np.isclose(self.records["sample_rate"], sample_rate)
+        if life is not None:
+            result &= (self.records["life_fraction"] >= life[0]) & (self.records["life_fraction"] <= life[1])
+        return result
+
+    def select(self, **criteria):
+        '''
+        例如 catalog.select(fault=OUTER_FAULT, rps=37.5, life=(0.9, 1.0))
+        '''
+        return self[self.mask(**criteria)]
+
+    def handle(self, i):
+        record = self.records[i]
+        return self.factories[str(record["dataset"])](str(record["folder"]), str(record["file_name"]))
+
+    def handles(self):
+        '''
+        为每一行创建对应的BearingData对象
+        '''
+        return [self.handle(i) for i in range(len(self.records))]
+
+    def to_dataframe(self):
+        import pandas as pd
+        return pd.DataFrame(self.records)
@@ -1,5 +1,6 @@
 import numpy as np
 from scipy import signal, integrate
+from .filtering import design_sos
 
 
 def acceleration2velocity(data, sample_rate, hp_frequency = 1, use_detrend=True):
@@ -11,11 +12,11 @@ def acceleration2velocity(data, sample_rate, hp_frequency = 1, use_detrend=True)
     '''
     assert sample_rate > 0
     assert data is not None
-    sos = signal.butter(6, hp_frequency, "hp", fs=sample_rate, output="sos")
+    sos = design_sos("hp", 6, hp_frequency, sample_rate)
     if use_detrend:
         data = signal.detrend(data)
     data = signal.sosfilt(sos, data)
-    return integrate.cumulative_trapezoid(data, 1.0/sample_rate)
+    return integrate.cumulative_trapezoid(data, dx=1.0/sample_rate, axis=-1)
 
 
 def poorman_integrate(data, sample_rate):
@@ -4,7 +4,8 @@
 '''
 
 import os
-from sqlalchemy import Column, create_engine, String, Float, Integer, LargeBinary
+import numpy as np
+from sqlalchemy import Column, create_engine, event, insert, String, Float, Integer, LargeBinary
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -177,12 +178,45 @@ class BearingDataFeature(Base):
 
 
 
+class SourceFile(Base):
+    '''
+    计算特征时源文件的大小，修改时间和可选的内容哈希，用来做增量更新
+    '''
+    __tablename__ = "source_files"
+
+    id = Column(Integer, primary_key=True)
+
+    filename = Column(String(128), unique=True, index=True) #文件名, 和bearing_features的filename一致
+
+    bearing_name = Column(String, index=True)
+
+    size = Column(Integer)
+
+    mtime = Column(Integer) # 修改时间，纳秒
+
+    content_hash = Column(String(64)) # 内容哈希， 可以为空
+
+
+# bearing_features中除了主键以外的列
+FEATURE_COLUMNS = [c.name for c in BearingDataFeature.__table__.columns if not c.primary_key]
+
+
+def _set_sqlite_pragma(dbapi_connection, connection_record):
+    # WAL和synchronous=NORMAL可以大幅减少批量写入时的fsync次数
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
 class Database:
     def __init__(self, db_url = None):
         if db_url is None:
             db_file_path = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), "../bearing_features.db"))
             db_url = f"sqlite:///{db_file_path}"
         self.engine = create_engine(db_url)
+        if self.engine.dialect.name == "sqlite":
+            event.listen(self.engine, "connect", _set_sqlite_pragma)
         self.session_base = sessionmaker(bind= self.engine)
         Base.metadata.create_all(self.engine)
     
@@ -202,13 +236,91 @@ class Database:
     def delete_all_features(self):
         with self.session_base() as sess:
             sess.query(BearingDataFeature).delete()
+            sess.query(SourceFile).delete()
             sess.commit()
+
+    def list_source_files(self):
+        '''
+        返回 文件名 -> (size, mtime, content_hash)
+        '''
+        result = {}
+        with self.session_base() as sess:
+            for x in sess.query(SourceFile.filename, SourceFile.size, SourceFile.mtime, SourceFile.content_hash):
+                result[x[0]] = (x[1], x[2], x[3])
+        return result
+
+    def delete_features(self, filenames, chunk_size=500):
+        '''
+        删除这些文件的特征和源文件记录
+        '''
+        filenames = list(filenames)
+        with self.session_base() as sess:
+            for i in range(0, len(filenames), chunk_size):
+                chunk = filenames[i:i + chunk_size]
+                sess.query(BearingDataFeature).filter(BearingDataFeature.filename.in_(chunk)).delete(synchronize_session=False)
+                sess.query(SourceFile).filter(SourceFile.filename.in_(chunk)).delete(synchronize_session=False)
+            sess.commit()
+
+    def set_source_files(self, records, chunk_size=500):
+        '''
+        records为(filename, bearing_name, size, mtime, content_hash)的列表, 已经存在的文件会被覆盖
+        '''
+        records = list(records)
+        if len(records) == 0:
+            return
+        with self.session_base() as sess:
+            for i in range(0, len(records), chunk_size):
+                chunk = [r[0] for r in records[i:i + chunk_size]]
+                sess.query(SourceFile).filter(SourceFile.filename.in_(chunk)).delete(synchronize_session=False)
+            sess.commit()
+        with self.engine.begin() as conn:
+            conn.execute(insert(SourceFile.__table__), [
+                {"filename": r[0], "bearing_name": r[1], "size": r[2], "mtime": r[3], "content_hash": r[4]}
+                for r in records])
     
     def add_features(self, feature):
-        with self.session_base() as sess:
-            if isinstance(feature, list):
-                for f in feature:
-                    sess.add(f)
+        '''
+        feature可以是一个BearingDataFeature或者列表，通过add_features_bulk一次写入
+        '''
+        if not isinstance(feature, list):
+            feature = [feature]
+        batch = {}
+        for column in FEATURE_COLUMNS:
+            batch[column] = [getattr(f, column) for f in feature]
+        return self.add_features_bulk(batch)
+
+    def add_features_bulk(self, batch):
+        '''
+        批量写入特征， batch为列名到数组的字典或者numpy结构化数组, 缺少的列写入NULL
+        所有行在一个事务里用一次executemany写入
+        '''
+        if isinstance(batch, np.ndarray):
+            if batch.dtype.names is None:
+                raise ValueError("batch must be a structured array")
+            batch = {name: batch[name] for name in batch.dtype.names}
+        unknown = set(batch.keys()) - set(FEATURE_COLUMNS)
+        if len(unknown) > 0:
+            raise ValueError(f"unknown feature columns {sorted(unknown)}")
+        columns = list(batch.keys())
+        if len(columns) == 0:
+            return 0
+        values = []
+        for column in columns:
+            value = batch[column]
+            # numpy的标量类型sqlite不认识，转成python类型
+            values.append(value.tolist() if isinstance(value, np.ndarray) else list(value))
+        count = len(values[0])
+        for value in values:
+            if len(value) != count:
+                raise ValueError("inconsistent column length")
+        if count == 0:
+            return 0
+        with self.engine.begin() as conn:
+            if self.engine.dialect.paramstyle == "qmark":
+                # 直接使用驱动的executemany, 跳过sqlalchemy对每一行的参数处理
+                sql = f"INSERT INTO {BearingDataFeature.__tablename__} ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})"
+                conn.exec_driver_sql(sql, list(zip(*values)))
             else:
-                sess.add(f)
-            sess.commit()
+                rows = [dict(zip(columns, row)) for row in zip(*values)]
+                conn.execute(insert(BearingDataFeature.__table__), rows)
+        return count
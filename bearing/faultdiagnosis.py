@@ -1,6 +1,10 @@
+from functools import lru_cache
+
 import numpy as np
 from scipy import signal
+from scipy.fft import rfft, irfft, ifft, rfftfreq, next_fast_len
 from .bearingdata import FaultFrequency
+from .filtering import sos_filter
 
 class FaultAlarm:
     '''
@@ -14,32 +18,342 @@ class FaultAlarm:
         pass
 
 
+# 每一块的元素个数
+_BLOCK_ELEMENTS = 1 << 18
+
+
+@lru_cache(maxsize=64)
+def frequency_axis(n, sample_rate):
+    '''
+    n点FFT的正频率部分, 按(n, sample_rate)缓存, 返回的数组只读
+    '''
+    frequency = rfftfreq(n, 1.0 / sample_rate)[:(n - 1) // 2 + 1]
+    frequency.setflags(write=False)
+    return frequency
+
+
 def calc_fft(data, sample_rate):
     # 去除直流分量， 减少近0频率能量对数据的影响
     data = data- np.mean(data)
-    amplitude = np.fft.fft(data)
-    n = len(amplitude)
+    n = len(data)
     data_upper_bound = (n-1)//2+1
     # a = np.abs(a) * 2 / n
     # 取abs，去除复数部分, 只取正频率的数据
-    amplitude = np.abs(amplitude)[:data_upper_bound]
-    frequency = np.fft.fftfreq(n, 1.0/sample_rate)[:data_upper_bound]
-    return frequency, amplitude
+    amplitude = np.abs(rfft(data))[:data_upper_bound]
+    return frequency_axis(n, sample_rate), amplitude
 
-def data_filter(data, band, order, method, sample_rate):
-    sos = signal.butter(order, band, method, fs=sample_rate, output="sos")
-    return signal.sosfilt(sos, data)
+def data_filter(data, band, order, method, sample_rate, axis=-1, zi=None):
+    '''
+    滤波器设计按参数缓存， zi不为None的时候返回(滤波结果, 最后的状态)， 见filtering.sos_filter
+    '''
+    return sos_filter(data, method, order, band, sample_rate, axis=axis, zi=zi)
 
 def demodulate(data, sample_rate):
-    data = data - np.mean(data)
-    analytical_data = signal.hilbert(data)
-    envelope = np.abs(analytical_data)
-    return calc_fft(envelope, sample_rate)
+    return envelope_spectrum(data, sample_rate)
+
+def _hilbert_envelope(x, nfft, workers):
+    '''
+    一块去均值之后的信号的包络
+    '''
+    # 希尔伯特变换: 正频率乘以-j, 直流和奈奎斯特频率置0
+    spectrum = rfft(x, nfft, axis=1, workers=workers)
+    spectrum *= -1j
+    spectrum[:, 0] = 0
+    if nfft % 2 == 0:
+        spectrum[:, -1] = 0
+    hx = irfft(spectrum, nfft, axis=1, workers=workers)[:, :x.shape[1]]
+    # np.hypot和np.abs做了防溢出的缩放, 比直接开方慢很多
+    return np.sqrt(np.square(x) + np.square(hx))
+
+
+def envelope_spectrum(data, sample_rate, workers=-1):
+    '''
+    包络谱的批量计算
+    data为一维信号或者 信号数 x 采样点 的二维数组, 一次调用可以得到整个寿命周期的包络谱
+    信号补零到next_fast_len, 希尔伯特变换和包络的频谱都用实数FFT计算, workers为FFT使用的线程数
+    返回(frequency, amplitude), amplitude为 信号数 x 频率点数 的幅值(一维输入时为一维)
+    '''
+    data = np.asarray(data, dtype=np.float64)
+    single = data.ndim == 1
+    if single:
+        data = data[np.newaxis, :]
+    if data.ndim != 2 or data.shape[1] == 0:
+        raise ValueError("data must be a non-empty signal or signals x samples array")
+    count, n = data.shape
+    nfft = next_fast_len(n, real=True)
+    upper_bound = (nfft - 1) // 2 + 1
+    amplitude = np.empty((count, upper_bound))
+    block = max(1, _BLOCK_ELEMENTS // nfft)
+    for start in range(0, count, block):
+        stop = min(count, start + block)
+        x = data[start:stop] - data[start:stop].mean(axis=1, keepdims=True)
+        envelope = _hilbert_envelope(x, nfft, workers)
+        envelope -= envelope.mean(axis=1, keepdims=True)
+        spectrum = rfft(envelope, nfft, axis=1, workers=workers)[:, :upper_bound]
+        amplitude[start:stop] = np.sqrt(np.square(spectrum.real) + np.square(spectrum.imag))
+    return frequency_axis(nfft, sample_rate), amplitude[0] if single else amplitude
+
+
+def _baseband_plan(n, sample_rate, band, max_frequency):
+    '''
+    复数外差降采样的参数(nfft, band_start, band_stop, m, valid)
+    频带[band_start, band_stop)的频谱搬到0频率之后做m点逆FFT， 前valid个点对应原来的n个采样点
+    '''
+    low, high = band
+    if not 0 <= low < high <= sample_rate / 2:
+        raise ValueError("band must be inside (0, sample_rate / 2)")
+    nfft = next_fast_len(n, real=True)
+    band_start = int(np.ceil(low * nfft / sample_rate))
+    band_stop = int(np.floor(high * nfft / sample_rate)) + 1
+    # 降采样之后的采样频率要大于包络的带宽(2倍频带宽度)和2倍的max_frequency
+    max_bin = int(np.ceil(max_frequency * nfft / sample_rate))
+    m = next_fast_len(max(2 * (band_stop - band_start), 2 * max_bin + 2))
+    valid = min(m, int(np.ceil(n * m / nfft)))
+    return nfft, band_start, band_stop, m, valid
+
+
+def _baseband_envelope(data, plan, workers):
+    '''
+    一块信号的降采样包络(没有去均值)， 幅值和原采样频率下的包络一致
+    '''
+    nfft, band_start, band_stop, m, valid = plan
+    spectrum = rfft(data, nfft, axis=1, workers=workers)
+    baseband = np.zeros((len(data), m), dtype=complex)
+    baseband[:, :band_stop - band_start] = spectrum[:, band_start:band_stop]
+    baseband = ifft(baseband, axis=1, workers=workers)[:, :valid]
+    # 解析信号的正频率乘2, ifft的长度从nfft变成m
+    envelope = np.sqrt(np.square(baseband.real) + np.square(baseband.imag))
+    envelope *= 2.0 * m / nfft
+    return envelope
+
+
+def zoom_envelope_spectrum(data, sample_rate, band, max_frequency, resolution=None, workers=-1):
+    '''
+    只计算低频部分的包络谱
+    band为共振频带(低频, 高频)， 信号的频谱只保留这个频带并平移到0频率(复数外差)，
+    用较短的逆FFT得到降采样之后的复数基带信号， 相当于理想带通滤波之后降采样，
+    它的模就是包络， 包络和包络谱都在降采样之后计算
+    max_frequency为需要的最高频率(比如几倍的BPFI)， resolution为最大的频率间隔， 默认为 sample_rate / 采样点数
+    幅值和envelope_spectrum的尺度一致
+    返回(frequency, amplitude)， 只包含0到max_frequency的频率点
+    '''
+    data = np.asarray(data, dtype=np.float64)
+    single = data.ndim == 1
+    if single:
+        data = data[np.newaxis, :]
+    if data.ndim != 2 or data.shape[1] == 0:
+        raise ValueError("data must be a non-empty signal or signals x samples array")
+    count, n = data.shape
+    plan = _baseband_plan(n, sample_rate, band, max_frequency)
+    nfft, _, _, m, valid = plan
+    decimated_rate = sample_rate * m / nfft
+    n_envelope = valid
+    if resolution is not None:
+        n_envelope = max(valid, int(np.ceil(decimated_rate / resolution)))
+    n_envelope = next_fast_len(n_envelope, real=True)
+    frequency = frequency_axis(n_envelope, decimated_rate)
+    upper_bound = int(np.searchsorted(frequency, max_frequency, side="right"))
+    amplitude = np.empty((count, upper_bound))
+    block = max(1, _BLOCK_ELEMENTS // nfft)
+    for start in range(0, count, block):
+        stop = min(count, start + block)
+        envelope = _baseband_envelope(data[start:stop], plan, workers)
+        envelope -= envelope.mean(axis=1, keepdims=True)
+        spectrum = rfft(envelope, n_envelope, axis=1, workers=workers)[:, :upper_bound]
+        amplitude[start:stop] = np.sqrt(np.square(spectrum.real) + np.square(spectrum.imag)) * (n / valid)
+    frequency = frequency[:upper_bound]
+    return frequency, amplitude[0] if single else amplitude
+
+
+FAULT_NAMES = ("bpfi", "bpfo", "bsf", "ftf")
+
+
+def fault_frequencies(source):
+    '''
+    source为FaultFrequency或者BearingData， 返回 故障名称 -> 故障频率系数 * rps
+    '''
+    return {name: getattr(source, name + "_rate") * source.rps for name in FAULT_NAMES}
+
+
+@lru_cache(maxsize=256)
+def _zoom_transform(n, low, high, points, sample_rate):
+    return signal.ZoomFFT(n, [low, high], points, fs=sample_rate, endpoint=True)
+
+
+def zoom_spectrum(data, sample_rate, low, high, points=64):
+    '''
+    用chirp-z变换只计算[low, high]内均匀分布的points个频率点， 频率间隔不受 sample_rate / 采样点数 的限制
+    data为一维信号或者 信号数 x 采样点 的二维数组， 变换按(采样点数, 频带, 点数, 采样频率)缓存
+    幅值和calc_fft的尺度一致(没有去直流)
+    返回(frequency, amplitude)
+    '''
+    data = np.asarray(data, dtype=np.float64)
+    if not 0 <= low < high <= sample_rate / 2:
+        raise ValueError("zoom band must be inside (0, sample_rate / 2)")
+    transform = _zoom_transform(data.shape[-1], float(low), float(high), int(points), float(sample_rate))
+    spectrum = transform(data, axis=-1)
+    frequency = np.linspace(low, high, points)
+    return frequency, np.sqrt(np.square(spectrum.real) + np.square(spectrum.imag))
+
+
+def fault_amplitudes(data, sample_rate, fault_frequency, harmonics=3, half_width=3.0, points=64,
+                     band=None, workers=-1):
+    '''
+    故障频率各次谐波处的包络谱幅值
+    fault_frequency为设置了rps的FaultFrequency或者BearingData， 对bpfi, bpfo, bsf, ftf的1到harmonics倍频，
+    只在 k倍故障频率 ± half_width 内用chirp-z变换计算points个频率点并取最大值，
+    频率间隔为 2 * half_width / (points - 1)， 得到的峰值频率和幅值可以在FFT的两个频率点之间
+    band不为None的时候用zoom_envelope_spectrum的方法在共振频带内降采样， 否则使用整个频带的包络，
+    再把包络低通降采样到刚好覆盖最高次谐波， chirp-z变换只在很短的包络上计算
+    幅值和envelope_spectrum的尺度一致
+    返回 故障名称 -> (frequency, amplitude)， 形状为 信号数 x harmonics(一维输入时为 harmonics)
+    '''
+    data = np.asarray(data, dtype=np.float64)
+    single = data.ndim == 1
+    if single:
+        data = data[np.newaxis, :]
+    if data.ndim != 2 or data.shape[1] == 0:
+        raise ValueError("data must be a non-empty signal or signals x samples array")
+    count, n = data.shape
+    targets = fault_frequencies(fault_frequency)
+    orders = np.arange(1, harmonics + 1)
+    max_frequency = harmonics * max(targets.values()) + half_width
+    if band is None:
+        nfft = next_fast_len(n, real=True)
+        # 包络只保留max_frequency以下的频谱， 用较短的逆FFT降采样
+        m = next_fast_len(2 * int(np.ceil(max_frequency * nfft / sample_rate)) + 2, real=True)
+    else:
+        plan = _baseband_plan(n, sample_rate, band, max_frequency)
+        nfft, _, _, m, _ = plan
+    m = min(m, nfft)
+    valid = min(m, int(np.ceil(n * m / nfft)))
+    envelope_rate, scale = sample_rate * m / nfft, n / valid
+    if max_frequency > envelope_rate / 2:
+        raise ValueError("highest harmonic window is above the envelope nyquist frequency")
+    result = {name: (np.empty((count, harmonics)), np.empty((count, harmonics))) for name in targets}
+    block = max(1, _BLOCK_ELEMENTS // nfft)
+    for start in range(0, count, block):
+        stop = min(count, start + block)
+        if band is None:
+            x = data[start:stop] - data[start:stop].mean(axis=1, keepdims=True)
+            envelope = _hilbert_envelope(x, nfft, workers)
+            spectrum = rfft(envelope, nfft, axis=1, workers=workers)[:, :m // 2 + 1]
+            envelope = irfft(spectrum, m, axis=1, workers=workers)[:, :valid] * (m / nfft)
+        else:
+            envelope = _baseband_envelope(data[start:stop], plan, workers)
+        envelope -= envelope.mean(axis=1, keepdims=True)
+        for name, base in targets.items():
+            frequency, amplitude = result[name]
+            for j, center in enumerate(orders * base):
+                grid, spectrum = zoom_spectrum(envelope, envelope_rate, max(center - half_width, 0.0),
+                                               center + half_width, points)
+                peak = np.argmax(spectrum, axis=1)
+                frequency[start:stop, j] = grid[peak]
+                amplitude[start:stop, j] = spectrum[np.arange(stop - start), peak] * scale
+    if single:
+        return {name: (frequency[0], amplitude[0]) for name, (frequency, amplitude) in result.items()}
+    return result
 
 
 class DiagnosisResult:
+    '''
+    一批文件的诊断结果， 第一维都是文件， 故障类型的顺序和FAULT_NAMES一致
+    target_frequency为 文件 x 故障 x 谐波 x 边带 的理论频率， 边带的顺序为 -K..-1, 0, 1..K 倍rps， 第0个边带以外的是边频
+    peak_frequency, amplitude为每个频率附近搜索到的峰值
+    noise_floor为 文件 x 故障 x 谐波 的局部噪声(谐波附近包络谱的中位数， 不包括搜索窗口和低频)
+    ratio为 峰值和噪声的功率比， 无效的频率(比如负频率的边带)为0，
+    sideband_score为 文件 x 故障 的边频证据(每次谐波两侧有效边频功率比的平均值， 再对谐波平均)，
+    每次谐波的证据为谐波功率比c， 谐波本身 c >= sideband_gate 的时候为
+    c和 (c + sideband_weight * 边频功率比) / (1 + sideband_weight) 中较大的一个， score为各次谐波证据的平均值，
+    内圈和滚动体故障被转频调制， 边频比谐波强的时候提高score， 没有调制的外圈故障不会因为边频弱而降低score，
+    faulty为 score >= power_ratio
+    faulty_part为故障类型的位组合， 和BearingData.faulty_part的定义相同
+    一维输入的时候去掉文件这一维
+    '''
     def __init__(self, **kwargs):
-        self.frequency = kwargs.get("")
+        self.fault_names = FAULT_NAMES
+        self.target_frequency = kwargs.get("target_frequency")
+        self.peak_frequency = kwargs.get("peak_frequency")
+        self.amplitude = kwargs.get("amplitude")
+        self.noise_floor = kwargs.get("noise_floor")
+        self.ratio = kwargs.get("ratio")
+        self.sideband_score = kwargs.get("sideband_score")
+        self.score = kwargs.get("score")
+        self.faulty = kwargs.get("faulty")
+        self.faulty_part = kwargs.get("faulty_part")
+
+    @property
+    def harmonic_ratio(self):
+        return self.ratio[..., self.ratio.shape[-1] // 2]
+
+    @property
+    def sideband_ratio(self):
+        k = self.ratio.shape[-1] // 2
+        return np.concatenate((self.ratio[..., :k], self.ratio[..., k + 1:]), axis=-1)
+
+    @classmethod
+    def concat(cls, results):
+        fields = [name for name in vars(cls()) if name != "fault_names"]
+        return cls(**{name: np.concatenate([getattr(r, name) for r in results]) for name in fields})
+
+    def __len__(self):
+        return len(self.score)
+
+    def __getitem__(self, i):
+        return DiagnosisResult(**{name: value[i] for name, value in vars(self).items() if name != "fault_names"})
+
+
+@lru_cache(maxsize=256)
+def _diagnosis_plan(upper_bound, resolution, rates, rps, harmonics, sidebands, search_bandwidth, noise_bandwidth):
+    '''
+    诊断用到的包络谱序号， 按(频率点数, 频率间隔, 故障系数, rps, 参数)缓存
+    target为 故障 x 谐波 x 边带 的理论频率， peak_index为每个频率 ± search_bandwidth 内的序号，
+    搜索宽度不超过故障基频的1/4， 也不超过到其它故障类型最近频率的一半， 不同故障的搜索窗口互不重叠，
+    valid为在 [search_bandwidth, 奈奎斯特频率) 内的频率(比如ftf的低阶边带是负频率)，
+    noise_index为每个谐波附近 2 * noise_bandwidth 宽的序号， 跳过所有的搜索窗口和search_bandwidth以下的低频，
+    窗口到了边界就向另一侧延伸
+    '''
+    rates = np.asarray(rates)
+    target = (rates[:, np.newaxis, np.newaxis] * rps * np.arange(1, harmonics + 1)[:, np.newaxis]
+              + np.arange(-sidebands, sidebands + 1) * rps)
+    width = max(1, int(round(search_bandwidth / resolution)))
+    center = np.rint(target / resolution).astype(np.intp)
+    valid = (center >= width) & (center < upper_bound)
+    # 低频的故障(比如ftf)搜索宽度不超过基频的1/4, 到其它故障的频率留出一半的距离
+    limit = np.minimum(width, np.maximum(np.rint(rates * rps / 4 / resolution), 1)).astype(np.intp)
+    limit = np.broadcast_to(limit[:, np.newaxis, np.newaxis], center.shape).copy()
+    fault = np.broadcast_to(np.arange(len(rates))[:, np.newaxis, np.newaxis], center.shape)
+    lines, owner = [center[valid]], [fault[valid]]
+    # 没有搜索的高次谐波也会落到其它故障的窗口里， 比搜索窗口还密的谐波(比如ftf)分不开， 不算在内
+    top = center[valid].max() + width
+    for i, base in enumerate(rates * rps / resolution):
+        if base > 2 * width:
+            extra = np.rint(base * np.arange(harmonics + 1, int(top / base) + 1)).astype(np.intp)
+            lines.append(extra)
+            owner.append(np.full(len(extra), i))
+    lines, owner = np.concatenate(lines), np.concatenate(owner)
+    distance = np.abs(center.reshape(-1, 1) - lines)
+    distance = np.where(fault.reshape(-1, 1) != owner, distance, upper_bound).min(axis=1).reshape(center.shape)
+    limit = np.minimum(limit, (distance - 1) // 2).clip(0)
+    # 窗口外的序号用中心代替, 不影响最大值
+    offset = np.arange(-width, width + 1)
+    offset = np.where(np.abs(offset) <= limit[..., np.newaxis], offset, 0)
+    peak_index = np.clip(center[..., np.newaxis] + offset, 1, upper_bound - 1)
+    # 噪声不包括搜索窗口和两侧各一个频率点的泄漏
+    allowed = np.ones(upper_bound, dtype=bool)
+    allowed[:width] = False
+    for c, h in zip(center[valid], limit[valid]):
+        allowed[max(c - h - 1, 0):c + h + 2] = False
+    for c in lines[len(center[valid]):]:
+        allowed[max(c - width, 0):c + width + 1] = False
+    bins = np.flatnonzero(allowed)
+    count = min(2 * max(width + 1, int(round(noise_bandwidth / resolution))) + 1, len(bins))
+    harmonic = np.clip(center[:, :, sidebands], 0, upper_bound - 1)
+    nearest = np.argsort(np.abs(bins - harmonic[..., np.newaxis]), axis=-1, kind="stable")[..., :count]
+    noise_index = bins[nearest]
+    for array in (target, valid, peak_index, noise_index):
+        array.setflags(write=False)
+    return target, valid, peak_index, noise_index
 
 
 class FaultDiagnosis:
@@ -48,8 +362,13 @@ class FaultDiagnosis:
         self.filter_order = kwargs.get("filter_order", 8)
         self.filter_band = kwargs.get("filter_band", 800)
         self.filter_method = kwargs.get("filter_method", "hp")
-        self.power_ratio = kwargs.get("diagnose_ratio", 10.0)
+        self.power_ratio = kwargs.get("diagnose_ratio", 20.0)
         self.search_bandwidth = kwargs.get("search_bandwidth", 10)
+        self.harmonics = kwargs.get("harmonics", 3)
+        self.sidebands = kwargs.get("sidebands", 2)
+        self.noise_bandwidth = kwargs.get("noise_bandwidth", 50)
+        self.sideband_weight = kwargs.get("sideband_weight", 0.5)
+        self.sideband_gate = kwargs.get("sideband_gate", self.power_ratio / 2)
     
     def get_argument(self, **kwargs):
         order = kwargs.get("filter_order", self.filter_order)
@@ -57,26 +376,83 @@ class FaultDiagnosis:
         method = kwargs.get("filter_method", self.filter_method)
         return order, band, method
     
-    def find_side_band(self, envelope_fft, ):
-        pass
-
     def find_faulty_frequency(self, envelope_fft, round_per_second):
         '''
+        envelope_fft为envelope_spectrum返回的(frequency, amplitude)， amplitude可以是 文件 x 频率点 的二维数组，
+        round_per_second为一个rps或者每个文件的rps
+        所有故障类型的谐波和边带在一次索引里取出， 相同rps的文件共用缓存的序号
+        边频的功率比按sideband_weight加权计入score， 见DiagnosisResult
+        diagnose_ratio默认为20， 白噪声的score(XJTU和CWRU的参数)不超过11， sideband_gate默认为diagnose_ratio的一半
         '''
-        fault_frequency = self.fault_frequency.clone().set_rps(round_per_second)
-        bpfi = fault_frequency.bpfi
-        bpfo = fault_frequency.bpfo
-        bsf = fault_frequency.bsf
-        ftf = fault_frequency.ftf
-
+        frequency, amplitude = envelope_fft
+        single = amplitude.ndim == 1
+        if single:
+            amplitude = amplitude[np.newaxis, :]
+        count, upper_bound = amplitude.shape
+        rates = tuple(float(getattr(self.fault_frequency, name + "_rate")) for name in FAULT_NAMES)
+        resolution = float(frequency[1] - frequency[0])
+        rps = np.broadcast_to(np.asarray(round_per_second, dtype=np.float64), (count,))
+        shape = (count, len(FAULT_NAMES), self.harmonics, 2 * self.sidebands + 1)
+        target_frequency = np.empty(shape)
+        peak_frequency = np.empty(shape)
+        peak = np.empty(shape)
+        noise_floor = np.empty(shape[:3])
+        valid = np.empty(shape, dtype=bool)
+        for value in np.unique(rps):
+            rows = np.flatnonzero(rps == value)
+            target, plan_valid, peak_index, noise_index = _diagnosis_plan(
+                upper_bound, resolution, rates, float(value), self.harmonics, self.sidebands,
+                float(self.search_bandwidth), float(self.noise_bandwidth))
+            window = amplitude[rows[:, np.newaxis], peak_index.reshape(1, -1)].reshape((len(rows),) + peak_index.shape)
+            best = np.argmax(window, axis=-1)
+            target_frequency[rows] = target
+            valid[rows] = plan_valid
+            peak[rows] = np.take_along_axis(window, best[..., np.newaxis], axis=-1)[..., 0]
+            peak_frequency[rows] = frequency[np.take_along_axis(
+                np.broadcast_to(peak_index, window.shape), best[..., np.newaxis], axis=-1)[..., 0]]
+            noise = amplitude[rows[:, np.newaxis], noise_index.reshape(1, -1)].reshape((len(rows),) + noise_index.shape)
+            noise_floor[rows] = np.median(noise, axis=-1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = np.where((noise_floor[..., np.newaxis] > 0) & valid,
+                             np.square(peak / noise_floor[..., np.newaxis]), 0.0)
+        # 中间的谐波以外都是边频， 只平均有效的边频
+        carrier = ratio[..., self.sidebands]
+        side = valid.copy()
+        side[..., self.sidebands] = False
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sideband = np.where(side.any(axis=-1), (ratio * side).sum(axis=-1) / side.sum(axis=-1), 0.0)
+        sideband_score = sideband.mean(axis=-1)
+        # 谐波本身超过sideband_gate的时候边频才作为证据
+        weight = self.sideband_weight
+        evidence = np.maximum(carrier, (carrier + weight * sideband) / (1 + weight))
+        score = np.where(carrier >= self.sideband_gate, evidence, carrier).mean(axis=-1)
+        faulty = score >= self.power_ratio
+        faulty_part = (faulty << np.arange(len(FAULT_NAMES))).sum(axis=-1)
+        result = DiagnosisResult(target_frequency=target_frequency, peak_frequency=peak_frequency, amplitude=peak,
+                                 noise_floor=noise_floor, ratio=ratio, sideband_score=sideband_score, score=score,
+                                 faulty=faulty, faulty_part=faulty_part)
+        return result[0] if single else result
 
-        
     def process(self, data, sample_rate, round_per_second, **kwargs):
         '''
         采用调制解调的方法，通过包络算法找到故障频率，如果故障频率的能量远远大于周边的频率能量，
         那么认为出现故障频率，当前轴承已经有故障
+        data可以是一个信号或者 文件 x 采样点 的二维数组
         '''
         order, band, method = self.get_argument(**kwargs)
         filtered_data = data_filter(data, band, order, method, sample_rate)
         envelope_fft = demodulate(filtered_data, sample_rate)
-        return self.find_faulty_frequency(envelope_fft, round_per_second)
\ No newline at end of file
+        return self.find_faulty_frequency(envelope_fft, round_per_second)
+
+    def process_batch(self, data, sample_rate, round_per_second, batch_size=256, **kwargs):
+        '''
+        data为 文件 x 采样点 的二维数组(比如整个寿命周期的文件)， round_per_second为一个rps或者每个文件的rps
+        每次滤波和解调batch_size个文件， 限制包络谱占用的内存， 返回所有文件的DiagnosisResult
+        '''
+        data = np.asarray(data, dtype=np.float64)
+        if data.ndim != 2:
+            raise ValueError("data must be a signals x samples array")
+        rps = np.broadcast_to(np.asarray(round_per_second, dtype=np.float64), (len(data),))
+        results = [self.process(data[start:start + batch_size], sample_rate, rps[start:start + batch_size], **kwargs)
+                   for start in range(0, len(data), batch_size)]
+        return DiagnosisResult.concat(results)
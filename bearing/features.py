@@ -0,0 +1,174 @@
+'''
+时域特征的批量计算
+一次处理 信号数 x 采样点 的二维数组， |x|， 中心矩等中间结果在各个特征之间共享
+'''
+
+import numpy as np
+
+
+# 列顺序和BearingDataFeature中的字段名一致
+FEATURE_NAMES = [
+    "mean",
+    "peak",
+    "peakpeak",
+    "rms",
+    "root_square",
+    "peak_factor",
+    "kurtosis_factor",
+    "skewness_factor",
+    "pulse_factror",
+    "allowance_factor",
+    "variance",
+    "std_var",
+]
+
+# 每一块的元素个数, 让中间结果尽量留在缓存里
+_BLOCK_ELEMENTS = 1 << 17
+
+
+def time_features(data):
+    '''
+    data为 信号数 x 采样点 的二维数组(一维数组当作一个信号)，
+    返回 信号数 x len(FEATURE_NAMES) 的特征矩阵
+    '''
+    data = np.asarray(data)
+    if data.ndim == 1:
+        data = data[np.newaxis, :]
+    if data.ndim != 2 or data.shape[1] == 0:
+        raise ValueError("data must be a non-empty signals x samples array")
+    count, n = data.shape
+    result = np.empty((count, len(FEATURE_NAMES)))
+    block = max(1, _BLOCK_ELEMENTS // n)
+    for start in range(0, count, block):
+        stop = min(count, start + block)
+        _time_features_block(np.asarray(data[start:stop], dtype=np.float64), result[start:stop])
+    return result
+
+
+def _time_features_block(x, out):
+    n = x.shape[1]
+    abs_x = np.abs(x)
+    mean_abs = abs_x.mean(axis=1)
+    peak = abs_x.max(axis=1)
+    peakpeak = x.max(axis=1) - x.min(axis=1)
+    root_square = (np.sqrt(abs_x, out=abs_x).sum(axis=1) / n) ** 2
+    mean = x.mean(axis=1)
+    d = x - mean[:, np.newaxis]
+    d2 = np.square(d)
+    m2 = d2.mean(axis=1)
+    m3 = np.einsum("ij,ij->i", d2, d) / n
+    m4 = np.einsum("ij,ij->i", d2, d2) / n
+    rms = np.sqrt(np.einsum("ij,ij->i", x, x) / n)
+    _fill_features(out, mean_abs, peak, peakpeak, rms, root_square, m2, m3, m4)
+
+
+def _fill_features(out, mean_abs, peak, peakpeak, rms, root_square, m2, m3, m4):
+    '''
+    m2, m3, m4为除以n之后的2,3,4阶中心矩
+    '''
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[:, 0] = mean_abs
+        out[:, 1] = peak
+        out[:, 2] = peakpeak
+        out[:, 3] = rms
+        out[:, 4] = root_square
+        out[:, 5] = np.where(rms > 0.000001, peakpeak / rms, 0.0)
+        out[:, 6] = m4 / m2 ** 2 - 3.0
+        out[:, 7] = m3 / m2 ** 1.5
+        out[:, 8] = peak / mean_abs
+        out[:, 9] = peak / root_square
+        out[:, 10] = m2
+        out[:, 11] = np.sqrt(m2)
+
+
+class StreamingTimeFeatures:
+    '''
+    分块计算时域特征， 内存占用和信号长度无关
+    每次update一块数据(一维数组或者 通道数 x 采样点)， 中心矩使用Welford/Pébay的单遍公式合并，
+    不同分块或者不同进程的部分结果可以用merge合并， 最后result返回和time_features一样的特征矩阵
+    '''
+    def __init__(self, channels=1):
+        self.channels = channels
+        self.n = 0
+        self.mean = np.zeros(channels)
+        self.m2 = np.zeros(channels) # 中心矩的和， 没有除以n
+        self.m3 = np.zeros(channels)
+        self.m4 = np.zeros(channels)
+        self.sum_abs = np.zeros(channels)
+        self.sum_sqrt_abs = np.zeros(channels)
+        self.sum_square = np.zeros(channels)
+        self.max = np.full(channels, -np.inf)
+        self.min = np.full(channels, np.inf)
+
+    def update(self, chunk):
+        chunk = np.asarray(chunk, dtype=np.float64)
+        if chunk.ndim == 1:
+            chunk = chunk[np.newaxis, :]
+        if chunk.shape[0] != self.channels:
+            raise ValueError(f"expect {self.channels} channels, got {chunk.shape[0]}")
+        n = chunk.shape[1]
+        if n == 0:
+            return self
+        other = StreamingTimeFeatures(self.channels)
+        other.n = n
+        other.mean = chunk.mean(axis=1)
+        d = chunk - other.mean[:, np.newaxis]
+        d2 = np.square(d)
+        other.m2 = d2.sum(axis=1)
+        other.m3 = np.einsum("ij,ij->i", d2, d)
+        other.m4 = np.einsum("ij,ij->i", d2, d2)
+        abs_chunk = np.abs(chunk)
+        other.sum_abs = abs_chunk.sum(axis=1)
+        other.sum_sqrt_abs = np.sqrt(abs_chunk, out=abs_chunk).sum(axis=1)
+        other.sum_square = np.einsum("ij,ij->i", chunk, chunk)
+        other.max = chunk.max(axis=1)
+        other.min = chunk.min(axis=1)
+        return self.merge(other)
+
+    def merge(self, other):
+        '''
+        把另一段数据的部分结果合并进来， 返回self
+        '''
+        if other.channels != self.channels:
+            raise ValueError("inconsistent channels")
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            for key, value in other.__dict__.items():
+                if isinstance(value, np.ndarray):
+                    value = value.copy()
+                setattr(self, key, value)
+            return self
+        na = float(self.n)
+        nb = float(other.n)
+        n = na + nb
+        delta = other.mean - self.mean
+        delta2 = delta * delta
+        m2 = self.m2 + other.m2 + delta2 * na * nb / n
+        m3 = (self.m3 + other.m3 + delta2 * delta * na * nb * (na - nb) / n ** 2
+              + 3.0 * delta * (na * other.m2 - nb * self.m2) / n)
+        m4 = (self.m4 + other.m4 + delta2 * delta2 * na * nb * (na * na - na * nb + nb * nb) / n ** 3
+              + 6.0 * delta2 * (na * na * other.m2 + nb * nb * self.m2) / n ** 2
+              + 4.0 * delta * (na * other.m3 - nb * self.m3) / n)
+        self.mean = self.mean + delta * nb / n
+        self.m2, self.m3, self.m4 = m2, m3, m4
+        self.sum_abs = self.sum_abs + other.sum_abs
+        self.sum_sqrt_abs = self.sum_sqrt_abs + other.sum_sqrt_abs
+        self.sum_square = self.sum_square + other.sum_square
+        self.max = np.maximum(self.max, other.max)
+        self.min = np.minimum(self.min, other.min)
+        self.n = self.n + other.n
+        return self
+
+    def result(self):
+        '''
+        返回 通道数 x len(FEATURE_NAMES) 的特征矩阵
+        '''
+        if self.n == 0:
+            raise ValueError("no data")
+        n = self.n
+        out = np.empty((self.channels, len(FEATURE_NAMES)))
+        _fill_features(out, self.sum_abs / n, np.maximum(np.abs(self.max), np.abs(self.min)),
+                       self.max - self.min, np.sqrt(self.sum_square / n), (self.sum_sqrt_abs / n) ** 2,
+                       self.m2 / n, self.m3 / n, self.m4 / n)
+        return out
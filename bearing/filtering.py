@@ -0,0 +1,72 @@
+'''
+巴特沃斯滤波器的设计缓存和批量滤波
+同样的(类型, 阶数, 频带, 采样频率)只设计一次，
+滤波沿着采样点所在的轴对 信号数 x 采样点 的二维数组一次完成，
+传入和返回滤波器状态zi的时候， 连续的文件或者数据块可以无缝地接在一起滤波
+'''
+
+from functools import lru_cache
+
+import numpy as np
+from scipy import signal
+
+
+@lru_cache(maxsize=256)
+def _design(method, order, band, sample_rate):
+    # sosfilt不接受只读的系数， 缓存的数组不能修改
+    return signal.butter(order, band, method, fs=sample_rate, output="sos")
+
+
+def design_sos(method, order, band, sample_rate):
+    '''
+    method为"lp", "hp", "bp", "bs"等signal.butter的类型， band为截止频率或者(低频, 高频)
+    按(method, order, band, sample_rate)缓存， 返回的sos系数是共享的， 不要修改
+    '''
+    if np.ndim(band) == 0:
+        band = float(band)
+    else:
+        band = tuple(float(b) for b in band)
+    return _design(method, int(order), band, float(sample_rate))
+
+
+def initial_state(sos, shape, axis=-1):
+    '''
+    形状为shape的数据沿axis滤波时的全0状态
+    '''
+    shape = list(shape)
+    shape[axis] = 2
+    return np.zeros((len(sos),) + tuple(shape))
+
+
+def sos_filter(data, method, order, band, sample_rate, axis=-1, zi=None):
+    '''
+    data为一维信号或者 信号数 x 采样点 的二维数组， 沿axis滤波
+    zi为None的时候只返回滤波结果， 否则返回(滤波结果, 最后的状态)，
+    第一块数据可以用initial_state得到zi
+    '''
+    sos = design_sos(method, order, band, sample_rate)
+    data = np.asarray(data, dtype=np.float64)
+    if zi is None:
+        return signal.sosfilt(sos, data, axis=axis)
+    return signal.sosfilt(sos, data, axis=axis, zi=zi)
+
+
+class StreamFilter:
+    '''
+    流式滤波， 每次调用process处理下一块数据， 滤波器状态在块之间保留，
+    结果和对整段数据一次滤波相同
+    '''
+    def __init__(self, method, order, band, sample_rate, axis=-1):
+        self.sos = design_sos(method, order, band, sample_rate)
+        self.axis = axis
+        self.zi = None
+
+    def process(self, data):
+        data = np.asarray(data, dtype=np.float64)
+        if self.zi is None:
+            self.zi = initial_state(self.sos, data.shape, self.axis)
+        y, self.zi = signal.sosfilt(self.sos, data, axis=self.axis, zi=self.zi)
+        return y
+
+    def reset(self):
+        self.zi = None
@@ -0,0 +1,60 @@
+'''
+数据集的文件清单
+第一次扫描目录之后把每个目录的文件名，大小，修改时间和参数保存到json文件，
+之后只要目录的修改时间和参数没有变化就直接使用清单，不需要再逐个检查文件
+'''
+
+import os
+import json
+
+
+class DatasetManifest:
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        self.folders = {}
+        self.dirty = False
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, "r") as f:
+                    self.folders = json.load(f).get("folders", {})
+            except (OSError, ValueError):
+                self.folders = {}
+
+    def list_folder(self, root, folder_name, params=None):
+        '''
+        返回目录下按文件名排序的[文件名, 大小, 修改时间]列表
+        目录不存在的时候抛出FileNotFoundError
+        '''
+        dir_path = os.path.join(root, folder_name)
+        mtime = os.stat(dir_path).st_mtime_ns
+        # 经过一次json转换，让tuple和list可以比较
+        params = json.loads(json.dumps(params))
+        entry = self.folders.get(folder_name)
+        if entry is not None and entry["mtime"] == mtime and entry.get("params") == params:
+            return entry["files"]
+        files = []
+        with os.scandir(dir_path) as it:
+            for e in it:
+                if e.is_file():
+                    st = e.stat()
+                    files.append([e.name, st.st_size, st.st_mtime_ns])
+        files.sort()
+        self.folders[folder_name] = {"mtime": mtime, "params": params, "files": files}
+        self.dirty = True
+        return files
+
+    def save(self):
+        '''
+        有变化的时候写回清单， 数据目录只读的时候忽略
+        '''
+        if not self.dirty:
+            return False
+        tmp_path = self.manifest_path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"folders": self.folders}, f)
+            os.replace(tmp_path, self.manifest_path)
+        except OSError:
+            return False
+        self.dirty = False
+        return True
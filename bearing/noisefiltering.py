@@ -1,19 +1,119 @@
 import numpy as np
-from numpy.fft import fft, ifft
+from scipy.fft import rfft, irfft
 
 
-def frenquecy_synchronous_average(data_array):
+class FrequencySynchronousAverager:
     '''
-    average data in frequency space
+    频域同步平均的累加器
+    每次加入一个或者一批(信号数 x 采样点)等长的信号， 只保存实数FFT的累加和， 内存为O(N)， 和平均的文件数无关
+    forgetting为None的时候是普通平均，
+    否则为指数遗忘: average = (1 - forgetting) * average + forgetting * 新的频谱， 用于连续监测
+    align为True的时候， 每个信号先用FFT互相关估计相对参考信号(reference， 默认为第一个信号)的延迟，
+    抛物线插值得到小数延迟， 再在频谱上乘以相位斜坡平移回来， 没有转速计的连续文件也不会把冲击平均掉，
+    比length长的信号截掉尾部， 短的信号在尾部补0， lags记录每个信号的延迟(采样点)
+    reset之后， 没有在构造时给出的length和reference由下一个信号重新确定
     '''
-    assert isinstance(data_array, list) and len(data_array) > 0
-    length = len(data_array[0])
-    assert length > 0
-    ffts = []
-    for data in data_array:
-        if len(data) != length:
+    def __init__(self, length=None, forgetting=None, align=False, reference=None):
+        if forgetting is not None and not 0 < forgetting <= 1:
+            raise ValueError("forgetting must be in (0, 1]")
+        self.forgetting = forgetting
+        self.align = align
+        self._length = length
+        self._reference = None if reference is None else np.asarray(reference, dtype=np.float64)
+        self.reset()
+
+    def add(self, data):
+        data = np.asarray(data, dtype=np.float64)
+        if data.ndim == 1:
+            data = data[np.newaxis, :]
+        if self.length is None:
+            self.length = data.shape[1]
+        if self.align and data.ndim == 2 and data.shape[1] > self.length:
+            data = data[:, :self.length]
+        elif self.align and data.ndim == 2 and 0 < data.shape[1] < self.length:
+            data = np.pad(data, ((0, 0), (0, self.length - data.shape[1])))
+        if data.ndim != 2 or data.shape[1] != self.length or self.length == 0:
             raise RuntimeError("inconsistent data length")
-        ffts.append(fft(data))
-    avg_fft = np.sum(ffts, axis=0) / len(data_array)
-    data = ifft(avg_fft)
-    return data
+        spectrum = rfft(data, axis=1)
+        if self.align:
+            spectrum = self._align(spectrum)
+        if self.accumulator is None:
+            self.accumulator = np.zeros(spectrum.shape[1], dtype=complex)
+        if self.forgetting is None:
+            self.accumulator += spectrum.sum(axis=0)
+        else:
+            for row in spectrum:
+                if self.count == 0:
+                    self.accumulator[:] = row
+                else:
+                    self.accumulator *= 1 - self.forgetting
+                    self.accumulator += self.forgetting * row
+                self.count += 1
+            return self
+        self.count += len(data)
+        return self
+
+    def _align(self, spectrum):
+        if self.reference is None:
+            self.reference = spectrum[0].copy()
+        n = self.length
+        correlation = irfft(np.conj(self.reference) * spectrum, n, axis=1)
+        rows = np.arange(len(spectrum))
+        peak = np.argmax(correlation, axis=1)
+        left = correlation[rows, peak - 1]
+        center = correlation[rows, peak]
+        right = correlation[rows, (peak + 1) % n]
+        # 相关峰附近做抛物线插值， 得到小数延迟
+        curvature = left - 2 * center + right
+        with np.errstate(divide="ignore", invalid="ignore"):
+            delta = np.where(curvature < 0, 0.5 * (left - right) / curvature, 0.0)
+        lag = peak + delta
+        lag = np.where(lag > n / 2, lag - n, lag)
+        self.lags.extend(lag.tolist())
+        # x(t) = r(t - lag)， 乘以exp(2j*pi*k*lag/n)平移回参考信号的位置
+        k = np.arange(spectrum.shape[1])
+        return spectrum * np.exp(2j * np.pi * np.outer(lag, k) / n)
+
+    def extend(self, data_iter):
+        '''
+        data_iter可以是列表或者生成器， 每次只读取一个信号
+        '''
+        for data in data_iter:
+            self.add(data)
+        return self
+
+    @property
+    def spectrum(self):
+        if self.count == 0:
+            raise RuntimeError("no data averaged")
+        if self.forgetting is None:
+            return self.accumulator / self.count
+        return self.accumulator.copy()
+
+    def result(self):
+        return irfft(self.spectrum, self.length)
+
+    def reset(self):
+        self.length = self._length
+        self.reference = None
+        if self._reference is not None:
+            self.length = self.length or len(self._reference)
+            self.reference = rfft(self._reference[:self.length], self.length)
+        self.count = 0
+        self.accumulator = None
+        self.lags = []
+        return self
+
+
+def frenquecy_synchronous_average(data_array, forgetting=None, align=False):
+    '''
+    average data in frequency space
+    data_array can be any iterable (or generator) of equal-length signals,
+    only the running rfft sum is kept, the result is real
+    with align=True every record is shifted onto the first one (FFT
+    cross-correlation, sub-sample phase ramp) before it is averaged
+    '''
+    averager = FrequencySynchronousAverager(forgetting=forgetting, align=align).extend(data_array)
+    if averager.count == 0:
+        raise RuntimeError("no data to average")
+    return averager.result()
@@ -0,0 +1,112 @@
+'''
+基于短时傅里叶变换的谱峭度
+信号只用strided view分帧一次， 每个窗长的所有帧用一次矩阵乘法计算频谱，
+比完整的快速峭度图便宜很多， 可以对整个寿命周期的每个文件计算
+'''
+
+from functools import lru_cache
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import signal
+from scipy.fft import rfftfreq
+
+
+DEFAULT_WINDOWS = (16, 32, 64, 128)
+
+# 每一块频谱的元素个数
+_BLOCK_ELEMENTS = 1 << 16
+
+
+@lru_cache(maxsize=None)
+def _dft_matrix(window_length, nfft):
+    '''
+    hann窗和nfft点DFT的前 nfft//2+1 个频率合成一个实数矩阵 [cos, -sin]，
+    短窗补零到nfft点的时候，矩阵乘法比rfft少算很多0
+    '''
+    bins = nfft // 2 + 1
+    phase = 2 * np.pi * np.outer(np.arange(window_length), np.arange(bins)) / nfft
+    window = signal.windows.hann(window_length)[:, np.newaxis]
+    matrix = np.hstack((window * np.cos(phase), -window * np.sin(phase)))
+    matrix.setflags(write=False)
+    return matrix
+
+
+class SpectralKurtosis:
+    '''
+    frequency为频率轴， windows为窗长
+    kurtosis为 信号数 x 窗长数 x 频率点数 的谱峭度
+    best_window, center_frequency, band(低频, 高频), max_kurtosis为每个信号谱峭度最大的窗长和频带
+    一维输入的时候去掉信号数这一维
+    '''
+    def __init__(self, frequency, windows, kurtosis, sample_rate):
+        self.frequency = frequency
+        self.windows = np.asarray(windows)
+        self.kurtosis = kurtosis
+        single = kurtosis.ndim == 2
+        if single:
+            kurtosis = kurtosis[np.newaxis]
+        # 直流和奈奎斯特频率的谱是实数， 峭度的基准不一样，不参与选择
+        inner = kurtosis[:, :, 1:-1].reshape(len(kurtosis), -1)
+        best = np.argmax(inner, axis=1)
+        window_index, bin_index = np.divmod(best, kurtosis.shape[2] - 2)
+        bin_index += 1
+        self.best_window = self.windows[window_index]
+        self.center_frequency = frequency[bin_index]
+        # 频带宽度取hann窗主瓣宽度(4 * sample_rate / window)的一半
+        half_width = sample_rate / self.best_window
+        self.band = np.stack((np.maximum(self.center_frequency - half_width, 0.0),
+                              np.minimum(self.center_frequency + half_width, sample_rate / 2)), axis=-1)
+        self.max_kurtosis = inner[np.arange(len(inner)), best]
+        if single:
+            self.best_window = self.best_window[0]
+            self.center_frequency = self.center_frequency[0]
+            self.band = self.band[0]
+            self.max_kurtosis = self.max_kurtosis[0]
+
+
+def spectral_kurtosis(data, sample_rate, windows=DEFAULT_WINDOWS, nfft=None):
+    '''
+    data为一维信号或者 信号数 x 采样点 的二维数组
+    每个窗长使用hann窗， 帧之间重叠一半， 所有窗长都补零到nfft点(默认为最大窗长的2倍)， 频率轴相同
+    谱峭度为 mean(|S|^4) / mean(|S|^2)^2 - 2
+    返回SpectralKurtosis
+    '''
+    data = np.asarray(data, dtype=np.float64)
+    single = data.ndim == 1
+    if single:
+        data = data[np.newaxis, :]
+    if data.ndim != 2:
+        raise ValueError("data must be a signal or a signals x samples array")
+    windows = [int(w) for w in windows]
+    nfft = nfft or 2 * max(windows)
+    if nfft < max(windows):
+        raise ValueError("nfft must not be shorter than the windows")
+    count, n = data.shape
+    if n < max(windows):
+        raise ValueError("signal is shorter than the longest window")
+    bins = nfft // 2 + 1
+    # 每次计算的帧数， 让频谱留在缓存里
+    chunk = max(1, _BLOCK_ELEMENTS // (2 * bins))
+    kurtosis = np.empty((count, len(windows), bins))
+    for i, w in enumerate(windows):
+        hop = w - w // 2
+        view = sliding_window_view(data, w, axis=1)[:, ::hop]
+        frames = view.shape[1]
+        m2 = np.zeros((count, bins))
+        m4 = np.zeros((count, bins))
+        signal_block = max(1, chunk // frames)
+        frame_block = min(frames, chunk)
+        for start in range(0, count, signal_block):
+            stop = min(count, start + signal_block)
+            for frame_start in range(0, frames, frame_block):
+                part = view[start:stop, frame_start:frame_start + frame_block]
+                spectrum = np.ascontiguousarray(part) @ _dft_matrix(w, nfft)
+                power = np.square(spectrum[:, :, :bins])
+                power += np.square(spectrum[:, :, bins:])
+                m2[start:stop] += power.sum(axis=1)
+                m4[start:stop] += np.einsum("ijk,ijk->ik", power, power)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            kurtosis[:, i] = np.where(m2 > 0, m4 * frames / m2 ** 2 - 2, 0.0)
+    frequency = rfftfreq(nfft, 1.0 / sample_rate)
+    return SpectralKurtosis(frequency, windows, kurtosis[0] if single else kurtosis, sample_rate)
@@ -0,0 +1,111 @@
+'''
+所有BearingData共享的波形缓存
+按照字节数限制缓存大小，超过限制的时候淘汰最久没有使用的文件
+'''
+
+import threading
+from collections import OrderedDict
+
+
+class WaveformCache:
+    '''
+    key为数据文件路径， value为 通道名 -> 数组 的字典
+    hits, misses, evictions记录命中，未命中和淘汰的次数
+    '''
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getstate__(self):
+        # 传给子进程的时候只保留大小限制，不带数据
+        return {"max_bytes": self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(state["max_bytes"])
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _nbytes(waveforms):
+        return sum(getattr(value, "nbytes", 0) for value in waveforms.values())
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, waveforms):
+        nbytes = self._nbytes(waveforms)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            if nbytes > self.max_bytes:
+                return waveforms
+            self._entries[key] = (waveforms, nbytes)
+            self.current_bytes += nbytes
+            self._evict()
+        return waveforms
+
+    def get_or_load(self, key, loader):
+        '''
+        命中的时候直接返回，否则调用loader()读取并放入缓存
+        '''
+        waveforms = self.get(key)
+        if waveforms is None:
+            waveforms = self.put(key, loader())
+        return waveforms
+
+    def discard(self, key):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+
+    def resize(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and len(self._entries) > 0:
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            self.current_bytes -= nbytes
+            self.evictions += 1
+
+
+_default_cache = WaveformCache()
+
+
+def get_waveform_cache():
+    '''
+    默认的共享缓存, 可以用resize修改大小
+    '''
+    return _default_cache
@@ -7,6 +7,11 @@ def refresh_features():
     xjtu = XJTUData()
     xjtu.refresh_features(db)
 
+def update_features():
+    db = Database()
+    xjtu = XJTUData()
+    xjtu.update_features(db)
+
 db = Database()
 for x in db.list_features("Bearing3_1", "rms", "std_var"):
     print(x)
\ No newline at end of file
@@ -37,11 +37,12 @@ N_normal = len(file_list)
 ix_example = 1
 normal = []
 for ix_file in range(N_normal):
-    sr = int(io.loadmat(file_list[ix_file])['sr'])
-    teeth = int(io.loadmat(file_list[ix_file])['teeth'])
-    ppr = int(io.loadmat(file_list[ix_file])['ppr'])
-    gs = io.loadmat(file_list[ix_file])['gs']
-    tach = io.loadmat(file_list[ix_file])['tach']
+    mat = io.loadmat(file_list[ix_file])                       # Read each file once
+    sr = int(mat['sr'])
+    teeth = int(mat['teeth'])
+    ppr = int(mat['ppr'])
+    gs = mat['gs']
+    tach = mat['tach']
     tix = tach[ppr-1]
     cyc = math.floor(sr*tix)
     ta,t = sdol_tsa(gs, sr, tach, ppr)                          # TSA
@@ -59,8 +60,9 @@ file_list = os.listdir()
 N_fault = len(file_list)
 fault = []
 for i in file_list:
-    gs = io.loadmat(i)['gs']
-    tach = io.loadmat(i)['tach']
+    mat = io.loadmat(i)
+    gs = mat['gs']
+    tach = mat['tach']
     tix = tach[ppr-1]
     cyc = math.floor(sr*tix)
     ta,t = sdol_tsa(gs,sr,tach,ppr)                             # TSA
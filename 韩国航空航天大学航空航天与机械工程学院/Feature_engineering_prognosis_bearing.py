@@ -6,7 +6,7 @@ from scipy import io
 from scipy.stats import spearmanr
 from matplotlib import pyplot as plt
 
-from Functions.AR_filter import ar_filter
+from Functions.AR_filter import ARBaseline
 from Functions.Bear_feat import Bear_feat
 from Functions.TimeFeature import timefeature
 from Functions.Skbp import skbp
@@ -23,17 +23,26 @@ from Functions.Skbp import skbp
 
 ## IMS Bearing
 plt.rc('font', size=13)
+baseline_file = os.path.abspath('ar_baseline_IMS.npz')                  # Kept outside the data folder
 os.chdir('Data_repository/IMS_bearing')
-file_list = os.listdir()
+file_list = sorted(f for f in os.listdir() if f.endswith('.mat'))      # File names are acquisition times
 N_file = len(file_list)
 # 1. Feature extraction
 features = np.zeros((N_file, 15))
 fs = 20480; cutoff = 3; fr = 2000/60
 bff = np.array([7.0921, 8.9079, 0.4433, 4.1975])
+# AR model of the healthy bearing, fitted once on the first K files
+K_healthy = 20; maxk = 700
+baseline = None
+if os.path.exists(baseline_file):                                       # Refit when K_healthy or maxk changed
+    baseline = ARBaseline.load(baseline_file, K_healthy=K_healthy, maxk=maxk)
+if baseline is None:
+    baseline = ARBaseline.fit([io.loadmat(file_list[ix])['x'] for ix in range(K_healthy)], maxk)
+    baseline.save(baseline_file, K_healthy=K_healthy, maxk=maxk)
 for ix_file in range(N_file):
     x = io.loadmat(file_list[ix_file])['x']
     tmp1, fn_time = timefeature(x)                                      # Extract time domain features
-    xr = ar_filter(np.ravel(x), 700)[0]
+    xr = baseline.whiten(np.ravel(x))                                   # Residual against the healthy model
     xb = skbp(xr, fs, 4)
     tmp2, fn_bearing = Bear_feat(xb, fs, bff*fr, cutoff)                # Extract features for bearing
     features[ix_file, :] = np.concatenate([tmp1, tmp2])
@@ -1,29 +1,139 @@
-from scipy.stats import kurtosis
 from scipy.signal import lfilter
-from nitime.algorithms.autoregressive import AR_est_YW
+from scipy.fft import rfft, irfft, next_fast_len
 import numpy as np
 
 # ============================== Input ==========================================
 # x: Vibration signal
 # maxK: The maximum filter order to calculate iterations
 # ix: Plot the figure when the value is entered
+# refine: Search every order around the best coarse order (step 10 -> step 1)
 # ============================== Output =========================================
 # ardata: Residual signal
 # p: Selected filter order
 # ===============================================================================
 
-def ar_filter(x, maxk, ix = 0):
-    pp = np.arange(1,maxk,10); N = len(pp)
-    k = np.zeros(N)
-    for ix in range(0, N):
-        a1 = AR_est_YW(x, pp[ix], rxx=None)                 # AR filter parameter
-        xp = lfilter(np.append(0, a1[0]), [1], x, axis=0)
-        xn = x - xp
-        k[ix] = kurtosis(xn, fisher=False)
-
-    ind = np.where(k == np.max(k))[0][0]
-    p = pp[ind]
-    a1 = AR_est_YW(x, p)[0]
+def ar_filter(x, maxk, ix = 0, refine = False):
+    x = np.asarray(x, dtype='float64')
+    pp = np.arange(1,maxk,10)
+    maxp = max(pp[-1], maxk - 1) if refine else pp[-1]
+    A = levinson_durbin(autocorr(x, maxp), maxp)                                    # Coefficients for every order at once
+    k = ar_kurtosis(x, A, pp)                                                       # Kurtosis of residual for each order
+    p = pp[np.argmax(k)]
+    if refine:
+        pf = np.arange(max(1, p - 9), min(maxp, p + 9) + 1)
+        k = ar_kurtosis(x, A, pf)
+        p = pf[np.argmax(k)]
+    a1 = A[p - 1, :p]                                                               # AR filter parameter
     xp = lfilter(np.append(0, a1), [1], x, axis=0)
-    ardata = x - xp                                         # Residual signal
+    ardata = x - xp                                                                 # Residual signal
     return ardata, p
+
+# ============================== Input ==========================================
+# x: Vibration signal
+# maxlag: The maximum lag
+# ============================== Output =========================================
+# r: Biased autocorrelation estimate r[0..maxlag], computed once with FFT
+# ===============================================================================
+
+def autocorr(x, maxlag):
+    N = len(x); nfft = next_fast_len(2 * N)
+    X = rfft(x, nfft)
+    r = irfft(X.real ** 2 + X.imag ** 2, nfft)[:maxlag + 1] / N
+    return r
+
+# ============================== Input ==========================================
+# r: Autocorrelation r[0..maxp]
+# maxp: The maximum AR order
+# ============================== Output =========================================
+# A: (maxp x maxp) matrix, A[p-1, :p] are the Yule-Walker coefficients of order p
+#    for x(n) = a(1)x(n-1) + ... + a(p)x(n-p) + e(n)
+# ===============================================================================
+
+def levinson_durbin(r, maxp):
+    A = np.zeros((maxp, maxp))
+    a = np.zeros(0); E = r[0]
+    for m in range(1, maxp + 1):
+        k = (r[m] - np.dot(a, r[m - 1:0:-1])) / E                                 # Reflection coefficient
+        a = np.append(a - k * a[::-1], k)
+        E = E * (1 - k * k)
+        A[m - 1, :m] = a
+    return A
+
+# ============================== Input ==========================================
+# x: Vibration signal
+# A: Coefficient matrix from levinson_durbin
+# orders: AR orders to evaluate
+# ============================== Output =========================================
+# k: Kurtosis (fisher=False) of the residual signal for each order
+# ===============================================================================
+
+def ar_kurtosis(x, A, orders):
+    N = len(x); orders = np.asarray(orders)
+    nfft = next_fast_len(N + orders.max())
+    X = rfft(x, nfft)
+    k = np.zeros(len(orders))
+    step = max(1, (1 << 22) // nfft)                                                # Orders per FFT batch
+    for s in range(0, len(orders), step):
+        ps = orders[s:s + step]
+        B = np.zeros((len(ps), orders.max() + 1)); B[:, 0] = 1
+        for j, p in enumerate(ps):
+            B[j, 1:p + 1] = -A[p - 1, :p]                                          # Prediction error filter [1, -a]
+        xn = irfft(X * rfft(B, nfft, axis=1), nfft, axis=1, workers=-1)[:, :N]     # Residual signal for each order
+        xn = xn - np.mean(xn, axis=1, keepdims=True)
+        xn2 = xn * xn
+        m2 = np.mean(xn2, axis=1)
+        k[s:s + step] = np.einsum('ij,ij->i', xn2, xn2) / N / m2 ** 2
+    return k
+
+# ============================== Input ==========================================
+# signals: Healthy vibration signals of one bearing/channel (e.g. first K files)
+# maxK: The maximum filter order to calculate iterations
+# refine: Search every order around the best coarse order
+# ============================== Output =========================================
+# ARBaseline: AR model of the healthy machine. whiten(x) returns the residual
+# signal of a whole record, whiten_chunk(x) carries the filter state across
+# consecutive chunks of a stream. save/load persist the model as .npz, the
+# keyword arguments of save (e.g. the fit parameters) are stored with it and
+# load returns None when they differ from the ones it is given
+# ===============================================================================
+
+class ARBaseline:
+    def __init__(self, a):
+        self.a = np.asarray(a, dtype='float64'); self.p = len(self.a)
+        self.b = np.append(1, -self.a)                                              # Prediction error filter
+        self.zi = np.zeros(self.p)
+
+    @classmethod
+    def fit(cls, signals, maxk=700, refine=False):
+        signals = [np.ravel(np.asarray(x, dtype='float64')) for x in signals]
+        pp = np.arange(1,maxk,10)
+        maxp = max(pp[-1], maxk - 1) if refine else pp[-1]
+        r = np.mean([autocorr(x, maxp) for x in signals], axis=0)                  # Pooled autocorrelation
+        A = levinson_durbin(r, maxp)
+        k = np.mean([ar_kurtosis(x, A, pp) for x in signals], axis=0)
+        p = pp[np.argmax(k)]
+        if refine:
+            pf = np.arange(max(1, p - 9), min(maxp, p + 9) + 1)
+            k = np.mean([ar_kurtosis(x, A, pf) for x in signals], axis=0)
+            p = pf[np.argmax(k)]
+        return cls(A[p - 1, :p])
+
+    def whiten(self, x):
+        return lfilter(self.b, [1], np.asarray(x, dtype='float64'), axis=0)
+
+    def whiten_chunk(self, x):
+        y, self.zi = lfilter(self.b, [1], np.ravel(np.asarray(x, dtype='float64')), zi=self.zi)
+        return y
+
+    def reset(self):
+        self.zi = np.zeros(self.p)
+
+    def save(self, path, **params):
+        np.savez(path, a=self.a, **params)
+
+    @classmethod
+    def load(cls, path, **params):
+        with np.load(path) as data:
+            if any(k not in data or not np.array_equal(data[k], v) for k, v in params.items()):
+                return None                                                         # Fitted with other parameters
+            return cls(data['a'])
@@ -1,9 +1,12 @@
 import math
+from functools import lru_cache
 
 import numpy as np
-from scipy.fft import fft
+from scipy.fft import fft, rfft, irfft
 from scipy.signal import lfilter, butter, hilbert
 
+from .band_index import freq_vector, band_plan, band_max
+
 # =========================================================================
 # This code is programmed by System Design Optimization Lab (SDOL) at Korea
 # Aerospace University (KAU)
@@ -12,51 +15,41 @@ from scipy.signal import lfilter, butter, hilbert
 # teeth: The number of teeth of gear
 # sr: Sampling rate
 # fr: Shaft rotational speed
+# mode: 'iir' removes the GMF harmonics and sidebands with cascaded Butterworth
+#       bandstop filters, 'fft' zeros the same bands in one rFFT of the TSA
+#       signal (exactly periodic, so no filter transients)
 # ============================= Output ====================================
 # feature: Calculated feature value
 # feature_name: The name of features
 # =========================================================================
 
-def gear_feat(tsa_sig, teeth, sr, fr):
+def gear_feat(tsa_sig, teeth, sr, fr, mode='iir'):
+    tsa_sig = np.ravel(tsa_sig)                                                   # sdol_tsa returns an (N, 1) column
     # FFT
     N = len(tsa_sig)
     X = np.abs(fft(tsa_sig, axis=0))/N*2; X = X[0:math.ceil(N/2)]
-    f = np.arange(0, N)/N*sr; f = f[0:math.ceil(N/2)]
+    f = freq_vector(N, sr)
     # Find rotating speed
-    ix = np.where((f>25) & (f<35))[0]; fr = f[ix][0]
+    ix = band_plan(N, sr, (30.0,), 5.0); fr = f[ix[0]]                         # First bin in (25, 35)
     # Find GMF
     gmf = teeth*fr; cutoff = sr/N*1.2
-    ix = np.where((f > gmf - cutoff) & (f < gmf + cutoff))[0]
-    gmf = f[np.where(X == np.max(X[ix]))[0][0]]
+    ix = band_plan(N, sr, (gmf,), cutoff)
+    gmf = f[ix[0] + np.argmax(X[ix[0]:ix[1]])]
     cutoff = 10
-    gmf_amp = np.zeros(10)
-    side_amp = np.zeros((2,6,10))
-    ind_side = np.zeros((2,6,10))
-    for hn in range(10):
-        P = gmf*(hn+1)
-        ix = np.where((f > P - cutoff) & (f < P + cutoff))[0]
-        gmf_amp[hn] = np.max(X[ix])
-        for sn in range(6):
-            S = fr*(sn+1)
-            ix_side1 = np.where((f > P - S - cutoff) & (f < P - S + cutoff))
-            ix_side2 = np.where((f > P + S - cutoff) & (f < P + S + cutoff))
-            side_amp[0, sn, hn] = np.max(X[ix_side1[0]])
-            side_amp[1, sn, hn] = np.max(X[ix_side2[0]])
-
-    # ==================== Calculate Residual signal ==========================
-    res_sig = tsa_sig; ord = 2
-    for hn in range(10):
-        P = gmf*(hn+1)
-        b, a = butter(ord, [(P-cutoff)/(sr/2), (P+cutoff)/(sr/2)],'bandstop')
-        res_sig = lfilter(b, a, res_sig, axis=0)
-    # =================== Calculate difference signal =========================
-    diff_sig = res_sig
-    for hn in range(10):
-        P = gmf * (hn + 1)
-        b, a = butter(ord, [(P - fr - cutoff) / (sr / 2), (P - fr + cutoff) / (sr / 2)], 'bandstop')
-        diff_sig = lfilter(b, a, diff_sig, axis=0)
-        b, a = butter(ord, [(P + fr - cutoff) / (sr / 2), (P + fr + cutoff) / (sr / 2)], 'bandstop')
-        diff_sig = lfilter(b, a, diff_sig, axis=0)
+    # Windows of the 10 GMF harmonics and their 6 sidebands on both sides (cached per gmf, fr)
+    P = gmf*np.arange(1, 11); S = fr*np.arange(1, 7)
+    side = np.stack((P - S[:, None], P + S[:, None]))                             # (side, sn, hn)
+    amp = band_max(X, band_plan(N, sr, tuple(np.concatenate((P, side.ravel())).tolist()), cutoff))
+    gmf_amp = amp[:10]
+    side_amp = amp[10:].reshape(2, 6, 10)
+    # ============== Calculate Residual and difference signal =================
+    if mode == 'fft':
+        res_sig, diff_sig = _fft_residual(tsa_sig, N, sr, gmf, fr, cutoff)
+    elif mode == 'iir':
+        res_sig, diff_sig = _iir_residual(tsa_sig, sr, gmf, fr, cutoff)
+    else:
+        raise ValueError("mode must be 'iir' or 'fft'")
+    ord = 2
     # =================== Calculate features for gear =========================
     # 1. FMO
     FM0 = (np.max(tsa_sig) - np.min(tsa_sig)) / np.sum(gmf_amp)
@@ -78,7 +71,7 @@ def gear_feat(tsa_sig, teeth, sr, fr):
     # 7. ER
     ER = np.sqrt(np.sum(diff_sig ** 2) / len(diff_sig)) / (np.sum(gmf_amp) + np.sum(side_amp))
     # 8. NB4
-    a, b = butter(ord, [(gmf - fr) / (sr / 2), (gmf + fr) / (sr / 2)], 'bandpass')
+    a, b = _butter(ord, gmf - fr, gmf + fr, sr, 'bandpass')
     bp_sig = lfilter(a, b, np.ravel(tsa_sig), axis=0)
     env_bp_sig = np.abs(hilbert(bp_sig))
     s = np.array((env_bp_sig - np.mean(env_bp_sig)))
@@ -90,3 +83,129 @@ def gear_feat(tsa_sig, teeth, sr, fr):
     feature = np.array([FM0, SER, NA4, FM4, M6A, M8A, ER, NB4], dtype='float64')
     feature_name = ['FM0', 'SER', 'NA4', 'FM4', 'M6A', 'M8A', 'ER', 'NB4']
     return feature, feature_name
+
+# Filter designs are cached: gmf, fr and sr repeat for every file of a run
+@lru_cache(maxsize=256)
+def _butter(ord, low, high, sr, btype):
+    return butter(ord, [low / (sr / 2), high / (sr / 2)], btype)
+
+# ============================= Input =====================================
+# tsa_sig: TSA signal
+# sr, gmf, fr: Sampling rate, gear mesh frequency and shaft speed
+# cutoff: Half bandwidth of every removed band
+# ============================= Output ====================================
+# res_sig: TSA signal without the GMF harmonics
+# diff_sig: Residual signal without the first sidebands of every harmonic
+# =========================================================================
+
+def _iir_residual(tsa_sig, sr, gmf, fr, cutoff):
+    # ==================== Calculate Residual signal ==========================
+    res_sig = tsa_sig; ord = 2
+    for hn in range(10):
+        P = gmf*(hn+1)
+        b, a = _butter(ord, P - cutoff, P + cutoff, sr, 'bandstop')
+        res_sig = lfilter(b, a, res_sig, axis=0)
+    # =================== Calculate difference signal =========================
+    diff_sig = res_sig
+    for hn in range(10):
+        P = gmf * (hn + 1)
+        b, a = _butter(ord, P - fr - cutoff, P - fr + cutoff, sr, 'bandstop')
+        diff_sig = lfilter(b, a, diff_sig, axis=0)
+        b, a = _butter(ord, P + fr - cutoff, P + fr + cutoff, sr, 'bandstop')
+        diff_sig = lfilter(b, a, diff_sig, axis=0)
+    return res_sig, diff_sig
+
+def _fft_residual(tsa_sig, N, sr, gmf, fr, cutoff):
+    res_mask, diff_mask = _fft_masks(N, sr, gmf, fr, cutoff)
+    shape = (-1,) + (1,)*(np.ndim(tsa_sig) - 1)
+    X = rfft(tsa_sig, axis=0)
+    res_sig = irfft(X*res_mask.reshape(shape), N, axis=0)
+    diff_sig = irfft(X*diff_mask.reshape(shape), N, axis=0)
+    return res_sig, diff_sig
+
+# Masks zero the rFFT bins inside (P - cutoff, P + cutoff) of the 10 GMF harmonics,
+# and for the difference signal also inside P - fr and P + fr. Cached per (N, sr, gmf, fr)
+@lru_cache(maxsize=256)
+def _fft_masks(N, sr, gmf, fr, cutoff):
+    P = gmf*np.arange(1, 11)
+    res_mask = np.ones(N//2 + 1)
+    ix = band_plan(N, sr, tuple(P.tolist()), cutoff)
+    for start, stop in ix.reshape(-1, 2):
+        res_mask[start:stop] = 0
+    diff_mask = res_mask.copy()
+    ix = band_plan(N, sr, tuple(np.concatenate((P - fr, P + fr)).tolist()), cutoff)
+    for start, stop in ix.reshape(-1, 2):
+        diff_mask[start:stop] = 0
+    res_mask.setflags(write=False); diff_mask.setflags(write=False)
+    return res_mask, diff_mask
+
+# ============================= Input =====================================
+# tsa_sigs: List of TSA signals (e.g. all HS gear records, lengths may differ)
+# teeth, sr, fr, mode: Same as gear_feat
+# ============================= Output ====================================
+# features: (records x 8) feature matrix, the same values as gear_feat per record
+# feature_name: The name of features
+# =========================================================================
+
+def gear_feat_batch(tsa_sigs, teeth, sr, fr, mode='iir'):
+    features = np.zeros((len(tsa_sigs), 8))
+    lengths = np.array([len(tsa_sig) for tsa_sig in tsa_sigs])
+    for N in np.unique(lengths):                                                  # Records of equal length are stacked as columns
+        rows = np.flatnonzero(lengths == N)
+        tsa = np.stack([np.ravel(tsa_sigs[i]) for i in rows], axis=1).astype('float64')
+        features[rows] = _gear_feat_columns(tsa, teeth, sr, mode).T
+    feature_name = ['FM0', 'SER', 'NA4', 'FM4', 'M6A', 'M8A', 'ER', 'NB4']
+    return features, feature_name
+
+# gear_feat of every column of tsa (N x records): one rFFT, mask and irFFT over axis 0,
+# the windows and filters that depend on the GMF are applied per distinct GMF
+def _gear_feat_columns(tsa, teeth, sr, mode):
+    # FFT
+    N = tsa.shape[0]
+    Y = rfft(tsa, axis=0)
+    X = np.abs(Y[0:math.ceil(N/2)])/N*2
+    f = freq_vector(N, sr)
+    # Find rotating speed
+    ix = band_plan(N, sr, (30.0,), 5.0); fr = f[ix[0]]
+    # Find GMF of every record
+    ix = band_plan(N, sr, (teeth*fr,), sr/N*1.2)
+    gmf = f[ix[0] + np.argmax(X[ix[0]:ix[1]], axis=0)]
+    cutoff = 10
+    amp = np.zeros((130, tsa.shape[1]))
+    res_mask = np.zeros((N//2 + 1, tsa.shape[1])); diff_mask = np.zeros_like(res_mask)
+    res_sig = np.zeros_like(tsa); diff_sig = np.zeros_like(tsa); bp_sig = np.zeros_like(tsa)
+    for g in np.unique(gmf):
+        cols = gmf == g
+        P = g*np.arange(1, 11); S = fr*np.arange(1, 7)
+        side = np.stack((P - S[:, None], P + S[:, None]))
+        amp[:, cols] = band_max(X[:, cols], band_plan(N, sr, tuple(np.concatenate((P, side.ravel())).tolist()), cutoff))
+        if mode == 'fft':
+            masks = _fft_masks(N, sr, g, fr, cutoff)
+            res_mask[:, cols] = masks[0][:, None]; diff_mask[:, cols] = masks[1][:, None]
+        elif mode == 'iir':
+            res_sig[:, cols], diff_sig[:, cols] = _iir_residual(tsa[:, cols], sr, g, fr, cutoff)
+        else:
+            raise ValueError("mode must be 'iir' or 'fft'")
+        a, b = _butter(2, g - fr, g + fr, sr, 'bandpass')
+        bp_sig[:, cols] = lfilter(a, b, tsa[:, cols], axis=0)
+    gmf_amp = amp[:10]
+    side_amp = amp[10:].reshape(2, 6, 10, -1)
+    # ============== Calculate Residual and difference signal =================
+    if mode == 'fft':
+        sig = irfft(np.concatenate((Y*res_mask, Y*diff_mask), axis=1), N, axis=0)
+        res_sig, diff_sig = np.split(sig, 2, axis=1)
+    # =================== Calculate features for gear =========================
+    FM0 = (np.max(tsa, 0) - np.min(tsa, 0)) / np.sum(gmf_amp, 0)
+    SER = np.sum(side_amp[:, :, 0], (0, 1)) / gmf_amp[0]
+    ress = np.square(res_sig - np.mean(res_sig, 0))                               # Powers by products, x ** n with n > 2 is slow
+    NA4 = N * np.sum(np.square(ress), 0) / (np.sum(ress, 0) ** 2)
+    diff2 = np.square(diff_sig - np.mean(diff_sig, 0)); diff4 = np.square(diff2)
+    d2 = np.sum(diff2, 0)
+    FM4 = N * np.sum(diff4, 0) / (d2 ** 2)
+    M6A = (N ** 2) * np.sum(diff4 * diff2, 0) / (d2 ** 3)
+    M8A = (N ** 2) * np.sum(np.square(diff4), 0) / (d2 ** 4)
+    ER = np.sqrt(np.sum(np.square(diff_sig), 0) / N) / (np.sum(gmf_amp, 0) + np.sum(side_amp, (0, 1, 2)))
+    env_bp_sig = np.abs(hilbert(bp_sig, axis=0))
+    s = np.square(env_bp_sig - np.mean(env_bp_sig, 0))
+    NB4 = N * np.sum(np.square(s), 0) / (np.sum(s, 0) ** 2)
+    return np.stack((FM0, SER, NA4, FM4, M6A, M8A, ER, NB4))
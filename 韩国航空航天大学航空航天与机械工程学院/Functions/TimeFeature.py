@@ -1,5 +1,4 @@
-from numpy import mean, std, abs, sum, sqrt, max, min, array
-from scipy.stats import kurtosis, skew
+import numpy as np
 
 # =========================================================================
 # This code is programmed by System Design Optimization Lab (SDOL) at Korea
@@ -11,21 +10,39 @@ from scipy.stats import kurtosis, skew
 # feature_name : The name of features
 # =========================================================================
 
+feature_names = ['MEAN','STD','RMS','SK','KUR','SF','CF','IF','MF','PEAK','P2P']
+
 def timefeature(x):
-     N = len(x)
-     xm = sum(x) / N                                                            # 1. Mean
-     xsd = std(x, ddof=1, axis=0)                                               # 2. Standard deviation
-     xrms = sqrt(sum(x ** 2)/len(x))                                            # 3. RMS
-     xsk = skew(x, axis=0)                                                      # 4. Skewness
-     xkurt = kurtosis(x, fisher=False)                                          # 5. Kurtosis
-     xsf = xrms / (1 / N * sum(abs(x)))                                         # 6. Shape factor
-     xcf = max(abs(x)) / xrms                                                   # 7. Crest factor
-     xif = max(abs(x)) / (1 / N * sum(abs(x)))                                  # 8. Impulse factor
-     xmf = max(abs(x)) / ((sum(sqrt(abs(x))) / N) ** 2)                         # 9. Margin factor
-     xp = max(abs(x))                                                           # 10. Peak
-     xp2p = max(x) - min(x)                                                     # 11. Peak-to-peak
+     feature = timefeatures(np.ravel(x))[0][0]
+     return feature, list(feature_names)
+
+# ============================== Input ====================================
+# X : Input data, one signal per row (signals x samples)
+# ============================== Output ===================================
+# feature : Calculated feature matrix (signals x 11)
+# feature_name : The name of features
+# =========================================================================
+
+def timefeatures(X):
+     X = np.atleast_2d(np.asarray(X, dtype='float64')); N = X.shape[1]
+     absx = np.abs(X)
+     xm = np.sum(X, axis=1) / N                                                 # 1. Mean
+     d = X - xm[:, None]; d2 = d ** 2
+     m2 = np.sum(d2, axis=1) / N                                                # Central moments shared by STD, SK, KUR
+     m3 = np.einsum('ij,ij->i', d2, d) / N
+     m4 = np.einsum('ij,ij->i', d2, d2) / N
+     xsd = np.sqrt(m2 * N / (N - 1))                                            # 2. Standard deviation
+     xrms = np.sqrt(np.einsum('ij,ij->i', X, X) / N)                            # 3. RMS
+     xsk = m3 / m2 ** 1.5                                                       # 4. Skewness
+     xkurt = m4 / m2 ** 2                                                       # 5. Kurtosis
+     xam = np.sum(absx, axis=1) / N                                             # Mean of |x|
+     xp = np.max(absx, axis=1)                                                  # 10. Peak
+     xsf = xrms / xam                                                           # 6. Shape factor
+     xcf = xp / xrms                                                            # 7. Crest factor
+     xif = xp / xam                                                             # 8. Impulse factor
+     xmf = xp / ((np.sum(np.sqrt(absx), axis=1) / N) ** 2)                      # 9. Margin factor
+     xp2p = np.max(X, axis=1) - np.min(X, axis=1)                               # 11. Peak-to-peak
 
-     feature = array([xm, xsd, xrms, xsk, xkurt, xsf, xcf, xif, xmf, xp, xp2p],dtype='float64')
-     feature_name = ['MEAN','STD','RMS','SK','KUR','SF','CF','IF','MF','PEAK','P2P']
-     return feature, feature_name
+     feature = np.stack([xm, xsd, xrms, xsk, xkurt, xsf, xcf, xif, xmf, xp, xp2p], axis=1)
+     return feature, list(feature_names)
 
@@ -0,0 +1,47 @@
+from functools import lru_cache
+
+import numpy as np
+
+# ============================== Input ==========================================
+# N: Signal length
+# fs: Sampling frequency
+# ============================== Output =========================================
+# f: One-sided frequency vector np.arange(0, N)/N*fs, first ceil(N/2) bins (read-only)
+# ===============================================================================
+
+@lru_cache(maxsize=64)
+def freq_vector(N, fs):
+    f = np.arange(0, N)/N*fs; f = f[0:-(-N // 2)]
+    f.setflags(write=False)
+    return f
+
+# ============================== Input ==========================================
+# N, fs: Signal length and sampling frequency of the spectrum
+# centers: Tuple of target frequencies
+# cutoff: Half bandwidth, window is the open interval (center - cutoff, center + cutoff)
+# ============================== Output =========================================
+# idx: Read-only [start0, stop0, start1, stop1, ...] slice bounds of every window,
+#      the same bins as the boolean mask (center - cutoff < f) & (f < center + cutoff)
+# ===============================================================================
+
+@lru_cache(maxsize=1024)
+def band_plan(N, fs, centers, cutoff):
+    f = freq_vector(N, fs); c = np.asarray(centers, dtype='float64')
+    start = np.searchsorted(f, c - cutoff, side='right')
+    stop = np.searchsorted(f, c + cutoff, side='left')
+    if np.any(stop <= start):
+        raise ValueError('empty frequency window')
+    idx = np.column_stack((start, stop)).ravel()
+    idx.setflags(write=False)
+    return idx
+
+# ============================== Input ==========================================
+# X: Spectrum of length ceil(N/2), or (ceil(N/2) x records) spectra
+# idx: Slice bounds from band_plan
+# ============================== Output =========================================
+# amp: Maximum of X inside every window, one reduceat pass over the spectrum (axis 0)
+# ===============================================================================
+
+def band_max(X, idx):
+    Xp = np.concatenate((X, np.full((1,) + np.shape(X)[1:], -np.inf)))            # Sentinel so stop == len(X) is valid
+    return np.maximum.reduceat(Xp, idx, axis=0)[::2]
@@ -38,9 +38,13 @@ POSSIBILITY OF SUCH DAMAGE.
 #
 # ------------------------------------------------------------------------------
 
+from functools import lru_cache
+import math
+
 from scipy.signal import firwin
 from scipy.signal import lfilter
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 
 
 def fast_kurtogram(x, fs, nlevel=7):
@@ -53,20 +57,7 @@ def fast_kurtogram(x, fs, nlevel=7):
 
     x -= np.mean(x)
 
-    N = 16
-    fc = 0.4
-
-    h = firwin(N + 1, fc) * np.exp(2j * np.pi * np.arange(N + 1) * 0.125)
-
-    n = np.arange(2, N + 2)
-
-    g = h[(1 - n) % N] * (-1.) ** (1 - n)
-
-    N = int(np.fix(3 / 2 * N))
-
-    h1 = firwin(N + 1, 2 / 3 * fc) * np.exp(2j * np.pi * np.arange(0, N + 1) * 0.25 / 3)
-    h2 = h1 * np.exp(2j * np.pi * np.arange(0, N + 1) / 6)
-    h3 = h1 * np.exp(2j * np.pi * np.arange(0, N + 1) / 3)
+    h, g, h1, h2, h3 = _filter_bank()
 
     Kwav = _K_wpQ(x, h, g, h1, h2, h3, nlevel, 'kurt2')
     Kwav = np.clip(Kwav, 0, np.inf)
@@ -95,6 +86,33 @@ def fast_kurtogram(x, fs, nlevel=7):
     return Kwav, Level_w, freq_w, c, np.amax(Kwav[np.arange(Kwav.shape[0]), np.argmax(Kwav, axis=1)]), bandwidth, level_max
 
 
+@lru_cache(maxsize=None)
+def _filter_bank():
+    '''
+    The filters only depend on constants, they are designed once and shared by all the calls.
+    The arrays are read-only.
+    '''
+    N = 16
+    fc = 0.4
+
+    h = firwin(N + 1, fc) * np.exp(2j * np.pi * np.arange(N + 1) * 0.125)
+
+    n = np.arange(2, N + 2)
+
+    g = h[(1 - n) % N] * (-1.) ** (1 - n)
+
+    N = int(np.fix(3 / 2 * N))
+
+    h1 = firwin(N + 1, 2 / 3 * fc) * np.exp(2j * np.pi * np.arange(0, N + 1) * 0.25 / 3)
+    h2 = h1 * np.exp(2j * np.pi * np.arange(0, N + 1) / 6)
+    h3 = h1 * np.exp(2j * np.pi * np.arange(0, N + 1) / 3)
+
+    for f in (h, g, h1, h2, h3):
+        f.setflags(write=False)
+
+    return h, g, h1, h2, h3
+
+
 def _kurt(this_x, opt):
     eps = 2.2204e-16
 
@@ -140,109 +158,262 @@ def _K_wpQ(x, h, g, h1, h2, h3, nlevel, opt, level=None):
     Computes the kurtosis K of the complete "binary-ternary" wavelet packet transform w of signal x,
     up to nlevel, using the lowpass and highpass filters h and g, respectively.
     The values in K are sorted according to the frequency decomposition.
-    '''
 
-    if level == None:
-        level = nlevel
+    The tree is built breadth first, all the nodes of one level are filtered together.
+    A level is cut into blocks of B samples: the window of a block (the block and the samples before it)
+    times one banded matrix gives the samples of a, d and of the three ternary bands kept after
+    decimation, so the binary and the ternary split of a level are a single matrix product.
+    The filters are linear, so the means of the bands are known before the blocks are filtered
+    (the sum of the outputs is the sum of the windows times the matrix), and the moments are
+    accumulated while a block is still in cache. Only a and d are kept for the next level,
+    the buffers are reused from one level to the next.
+    '''
 
     x = x.flatten()
-    L = np.floor(np.log2(x.size))
-    x = np.atleast_2d(x).T
-
-    KD, KQ = _K_wpQ_local(x, h, g, h1, h2, h3, nlevel, opt, level)
-
-    K = np.zeros((2 * nlevel, 3 * 2 ** nlevel))
+    opt = opt.lower()
 
-    K[0, :] = KD[0, :]
-
-    for i in np.arange(1, nlevel):
-        K[2 * i - 1, :] = KD[i, :]
-        K[2 * i, :] = KQ[i - 1, :]
+    Lh = np.amax(h.shape)
+    Lg = np.amax(g.shape)
 
-    K[2 * nlevel - 1, :] = KD[nlevel, :]
+    width = 3 * 2 ** nlevel
+    K = np.zeros((2 * nlevel, width))
+
+    # blocks of B samples, about chunk windows go through one matrix product
+    B = 12
+    chunk = 1024
+
+    # columns of the matrix: B // 2 samples of a, of d, then B // 3 samples of each ternary band
+    hg = np.zeros((max(Lh, Lg), 2), dtype=complex)
+    hg[:Lh, 0] = h
+    hg[:Lg, 1] = g
+    hq = np.stack((h1, h2, h3), axis=1)
+    pad = max(hg.shape[0] - 2, hq.shape[0] - 3)
+    Pb, Pt = B // 2, B // 3
+    G = np.concatenate((_banded(hg, 2, B, pad), _banded(hq, 3, B, pad)), axis=1)
+    # the sign of d[0::2] is changed, as in the recursive version
+    G[:, Pb:2 * Pb:2] *= -1
+
+    band = np.repeat(np.arange(5), [Pb, Pb, Pt, Pt, Pt])
+    phase = np.concatenate((np.arange(Pb), np.arange(Pb), np.tile(np.arange(Pt), 3)))
+    step = np.where(band < 2, Pb, Pt)
+    start = np.array([Lh - 1, Lg - 1, Lh - 1, Lh - 1, Lh - 1])[band]
+    first = np.flatnonzero(np.diff(np.r_[-1, band]))
+    r_lo = int(np.max(-(-start // step)))
+    q = -(-(B + pad) // B)
+
+    work = {}
+    N = x.size
+    R = _n_blocks(N, Pb, Pt, nlevel > 1)
+    nodes = np.zeros((1, (R + q) * B + pad), dtype=np.result_type(x, float))
+    nodes[0, pad:pad + N] = x
+
+    for i in range(1, nlevel + 1):
+        n = nodes.shape[0]
+        ternary = i < nlevel
+        C = G.shape[1] if ternary else 2 * Pb
+        F = 5 if ternary else 2
+        Gi = G[:, :C]
+        Gr = np.stack((Gi.real, Gi.imag), axis=-1).reshape(Gi.shape[0], 2 * C)
+        M2, M3 = N // 2, N // 3
+        end = np.where(band < 2, M2, M3)[:C]
+        count = (end - start[:C])[first[:F]]
+        r_hi = max(int(np.min(end // step[:C])), r_lo)
+
+        windows = sliding_window_view(nodes, B + pad, axis=1)[:, :R * B:B]
+
+        # the first and the last blocks are only partly inside [start, end), they are masked apart
+        edge = np.r_[0:min(r_lo, R), r_hi:R]
+        y_edge = (windows[:, edge].reshape(-1, B + pad) @ Gi).reshape(n, edge.size, C)
+        t = edge[:, np.newaxis] * step[:C] + phase[:C]
+        inside = (t >= start[:C]) & (t < end)
+
+        total = _window_sums(nodes, R, B, q)[:, :B + pad] @ Gi
+        total += (y_edge * inside).sum(axis=1) - y_edge.sum(axis=1)
+        mean = (np.add.reduceat(total, first[:F], axis=1) / count)[:, band[:C]]
+
+        R_next = _n_blocks(M2, Pb, Pt, i + 1 < nlevel)
+        out = _buffer(work, 'nodes%d' % (i % 2), (n, 2, max((R_next + q) * B + pad, pad + R * Pb)))
+        S = [np.zeros((n, 2 * C)), np.zeros((n, 2 * C if opt == 'kurt2' else C))]
+
+        rows = max(chunk // n, 1)
+        mean_rows = np.broadcast_to(mean[:, np.newaxis, :], (n, rows, C)).copy()
+        ones = np.ones((1, rows))
+        for r0 in range(0, R, rows):
+            r1 = min(r0 + rows, R)
+            w = _buffer(work, 'window', (n, r1 - r0, B + pad), nodes.dtype)
+            w[...] = windows[:, r0:r1]
+            w = w.reshape(-1, B + pad)
+            if np.iscomplexobj(w):
+                y = np.matmul(w, Gi, out=_buffer(work, 'y', (len(w), C)))
+            else:
+                y = np.matmul(w, Gr, out=_buffer(work, 'y', (len(w), 2 * C), float)).view(complex)
+            y = y.reshape(n, r1 - r0, C)
+            y -= mean_rows[:, :r1 - r0]
+
+            out[:, :, pad + r0 * Pb:pad + r1 * Pb].reshape(n, 2, r1 - r0, Pb)[...] = \
+                y[:, :, :2 * Pb].reshape(n, r1 - r0, 2, Pb).transpose(0, 2, 1, 3)
+
+            a, b = max(r0, r_lo), min(r1, r_hi)
+            if a < b:
+                _moments(y[:, a - r0:b - r0], opt, ones[:, :b - a], S, work)
+
+        y_edge -= mean[:, np.newaxis, :]
+        y_edge *= inside
+        _moments(y_edge, opt, np.ones((1, edge.size)), S, work)
+
+        # _kurt of every band, the real and imaginary parts of S[0] are summed with the samples
+        E = np.add.reduceat(S[0], 2 * first[:F], axis=1) / count
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if opt == 'kurt2':
+                KB = np.add.reduceat(S[1], 2 * first[:F], axis=1) / count / E ** 2 - 2
+            elif opt == 'kurt1':
+                A = np.add.reduceat(S[1], first[:F], axis=1) / count
+                KB = E / A ** 2 - 1.27
+                E = A
+        KB[E < 2.2204e-16] = 0
+
+        K[2 * i - 1, :] = np.repeat(KB[:, :2].ravel(), width // (2 * n))
+        if ternary:
+            K[2 * i, :] = np.repeat(KB[:, 2:].ravel(), width // (3 * n))
+
+        # like _kurt, the mean is only removed from a[Lh - 1:] and d[Lg - 1:]
+        out[:, 0, pad:pad + Lh - 1] += mean[:, :1]
+        out[:, 1, pad:pad + Lg - 1] += mean[:, Pb:Pb + 1]
+        out[:, :, :pad] = 0
+        out[:, :, pad + M2:] = 0
+        nodes = out.reshape(2 * n, -1)
+        N = M2
+        R = R_next
+
+    K[0, :] = _kurt_rows(x[np.newaxis, :], opt, 0)[0]
 
     return K
 
 
-def _K_wpQ_local(x, h, g, h1, h2, h3, nlevel, opt, level):
-    a, d = _DBFB(x, h, g)
-
-    N = np.amax(a.shape)
+def _n_blocks(N, Pb, Pt, ternary):
+    # blocks needed for the N // 2 samples of a and d, and the N // 3 samples of the ternary bands
+    R = -(-max(N // 2, 1) // Pb)
+    if ternary:
+        R = max(R, -(-(N // 3) // Pt))
+    return R
 
-    d = d * (-1) ** (np.atleast_2d(np.arange(1, N + 1)).T)
 
-    Lh = np.amax(h.shape)
-    Lg = np.amax(g.shape)
+def _banded(H, step, B, pad):
+    '''
+    Matrix of shape (B + pad, F * B // step), the window of a block times it gives
+    lfilter(H[:, j], 1, x)[step - 1::step] of the B // step samples of the block, for every filter j
+    '''
+    L, F = H.shape
+    P = B // step
+    G = np.zeros((B + pad, F, P), dtype=complex)
+    for t in range(P):
+        e = pad + step * (t + 1)
+        G[e - L:e, :, t] = H[::-1]
+    return G.reshape(B + pad, F * P)
+
+
+def _window_sums(nodes, R, B, q):
+    # sum of the windows of the R blocks of every row, for windows of q blocks of B samples
+    n = nodes.shape[0]
+    blocks = nodes[:, :(R + q) * B].reshape(n, R + q, B)
+    total = np.matmul(np.ones((1, R + q)), blocks)[:, 0]
+    S = np.empty((n, q * B), dtype=nodes.dtype)
+    for j in range(q):
+        S[:, j * B:(j + 1) * B] = total - blocks[:, :j].sum(axis=1) - blocks[:, j + R:].sum(axis=1)
+    return S
+
+
+def _moments(d, opt, ones, S, work):
+    '''
+    Adds the sums over the rows of d (nodes x rows x columns, mean already removed) to S:
+    |d| ** 2 to S[0], |d| ** 4 (kurt2) or |d| (kurt1) to S[1].
+    d is overwritten.
+    '''
+    q = _buffer(work, 'square', d.shape[:-1] + (2 * d.shape[-1],), float)
+    S[0] += np.matmul(ones, np.square(d.view(float), out=q))[:, 0]
+    if opt == 'kurt2':
+        d = np.multiply(d, d, out=d)
+        S[1] += np.matmul(ones, np.square(d.view(float), out=q))[:, 0]
+    elif opt == 'kurt1':
+        S[1] += np.matmul(ones, np.abs(d))[:, 0]
 
-    K1 = _kurt(a[Lh - 1:], opt)
-    K2 = _kurt(d[Lg - 1:], opt)
 
-    if level > 2:
-        a1, a2, a3 = _TBFB(a, h1, h2, h3)
-        d1, d2, d3 = _TBFB(d, h1, h2, h3)
+def _kurt_rows(X, opt, start):
+    '''
+    _kurt of X[i, start:] for every row i, the mean is removed in place like _kurt.
+    Only the first level is real, all the other nodes are complex.
+    '''
+    eps = 2.2204e-16
 
-        Ka1 = _kurt(a1[Lh - 1:], opt)
-        Ka2 = _kurt(a2[Lh - 1:], opt)
-        Ka3 = _kurt(a3[Lh - 1:], opt)
-        Kd1 = _kurt(d1[Lh - 1:], opt)
-        Kd2 = _kurt(d2[Lh - 1:], opt)
-        Kd3 = _kurt(d3[Lh - 1:], opt)
+    this_x = X[:, start:]
+    this_x -= np.mean(this_x, axis=1, keepdims=True)
 
+    if np.iscomplexobj(this_x):
+        A = this_x.real * this_x.real
+        A += this_x.imag * this_x.imag
     else:
-        Ka1 = 0
-        Ka2 = 0
-        Ka3 = 0
-        Kd1 = 0
-        Kd2 = 0
-        Kd3 = 0
-
-    if level == 1:
-        K = np.concatenate((K1 * np.ones(3), K2 * np.ones(3)))
-        #         print(K.shape)
-        KQ = np.array([Ka1, Ka2, Ka3, Kd1, Kd2, Kd3])
-
-    if level > 1:
-        Ka, KaQ = _K_wpQ_local(a, h, g, h1, h2, h3, nlevel, opt, level - 1)
-        Kd, KdQ = _K_wpQ_local(d, h, g, h1, h2, h3, nlevel, opt, level - 1)
-
-        K1 *= np.ones(np.amax(Ka.shape))
-        K2 *= np.ones(np.amax(Kd.shape))
-
-        K = np.vstack((np.concatenate([K1, K2]),
-                       np.hstack((Ka, Kd))))
+        A = this_x * this_x
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if opt.lower() == 'kurt2':
+            E = np.mean(A, axis=1)
+            K = np.einsum('ij,ij->i', A, A) / A.shape[1] / E ** 2
+            K -= 2 if np.iscomplexobj(this_x) else 3
+        elif opt.lower() == 'kurt1':
+            A = np.sqrt(A, out=A)
+            E = np.mean(A, axis=1)
+            K = np.einsum('ij,ij->i', A, A) / A.shape[1] / E ** 2
+            K -= 1.27 if np.iscomplexobj(this_x) else 1.57
+
+    # A row of zeros also has E = 0
+    K[E < eps] = 0
+    return K
 
-        Long = int(2 / 6 * np.amax(KaQ.shape))
-        Ka1 *= np.ones(Long)
-        Ka2 *= np.ones(Long)
-        Ka3 *= np.ones(Long)
-        Kd1 *= np.ones(Long)
-        Kd2 *= np.ones(Long)
-        Kd3 *= np.ones(Long)
 
-        KQ = np.vstack((np.concatenate([Ka1, Ka2, Ka3, Kd1, Kd2, Kd3]),
-                        np.hstack((KaQ, KdQ))))
+def _fir_decimate(x, H, step, work, P=8):
+    '''
+    Same as lfilter(H[:, j], 1, x[i])[step - 1::step] for every row x[i] and every filter H[:, j],
+    but only the samples kept after decimation are computed.
+    The signal is cut into blocks of step * P samples, each block (with the end of the previous one)
+    times a banded matrix of the filter taps gives P output samples, so a whole level is one matrix product.
+    Returns an array of shape (rows, N // step, filters)
+    '''
+    n, N = x.shape
+    L, F = H.shape
 
-    if level == nlevel:
-        K1 = _kurt(x, opt)
+    pad = L - step
+    P = max(P, -(-pad // step))
+    B = step * P
+    M = N // step
+    R = -(-M // P)
+    nb = max(R + 1, -(-(N + pad) // B))
 
-        K = np.vstack((K1 * np.ones(np.amax(K.shape)), K))
+    xp = _buffer(work, 'pad', (n, nb * B))
+    xp[:, :pad] = 0
+    xp[:, pad:pad + N] = x
+    xp[:, pad + N:] = 0
+    xp = xp.reshape(n, nb, B)
 
-        a1, a2, a3 = _TBFB(x, h1, h2, h3)
+    w = _buffer(work, 'window', (n, R, B + pad))
+    w[:, :, :B] = xp[:, :R]
+    w[:, :, B:] = xp[:, 1:R + 1, :pad]
 
-        Ka1 = _kurt(a1[Lh - 1:], opt)
-        Ka2 = _kurt(a2[Lh - 1:], opt)
-        Ka3 = _kurt(a3[Lh - 1:], opt)
+    G = np.zeros((B + pad, P, F), dtype=complex)
+    for t in range(P):
+        G[step * t:step * t + L, t] = H[::-1]
 
-        Long = int(1 / 3 * np.amax(KQ.shape))
+    y = _buffer(work, 'out', (n * R, P * F))
+    np.matmul(w.reshape(n * R, B + pad), G.reshape(B + pad, P * F), out=y)
 
-        Ka1 *= np.ones(Long)
-        Ka2 *= np.ones(Long)
-        Ka3 *= np.ones(Long)
+    return y.reshape(n, R * P, F)[:, :M]
 
-        KQ = np.vstack((np.concatenate([Ka1, Ka2, Ka3]),
-                        KQ[:-2, :]))
 
-    return K, KQ
+def _buffer(work, name, shape, dtype=complex):
+    size = math.prod(shape)
+    key = (name, np.dtype(dtype).char)
+    if key not in work or work[key].size < size:
+        work[key] = np.empty(size + size // 4, dtype=dtype)
+    return work[key][:size].reshape(shape)
 
 
 def _TBFB(x, h1, h2, h3):
@@ -263,22 +434,6 @@ def _TBFB(x, h1, h2, h3):
     return a1, a2, a3
 
 
-def _DBFB(x, h, g):
-    N = x.flatten().size
-
-    a = lfilter(h, 1, x.flatten())
-    a = a[1:N:2]
-    a = np.atleast_2d(a).T
-
-    d = lfilter(g, 1, x.flatten())
-
-    d = d[1:N:2]
-
-    d = np.atleast_2d(d).T
-
-    return a, d
-
-
 def binary(i, k):
     k = int(k)
 
@@ -365,37 +520,24 @@ def K_wpQ_filt(x, h, g, h1, h2, h3, acoeff, bcoeff, level=None):
 
 
 def K_wpQ_filt_local(x, h, g, h1, h2, h3, acoeff, bcoeff, level):
-    a, d = _DBFB(x, h, g)
-
-    N = a.size
-
-    level = int(level)
-
-    d = d * np.array([(-1) ** (np.arange(1, N + 1))]).T
+    '''
+    Follows the path given by acoeff (and bcoeff) down the tree, only the chosen filter is applied at each level
+    '''
+    work = {}
+    c = np.atleast_2d(x.flatten())
 
-    if level == 1:
-        if bcoeff.size == 0:
-            if acoeff[level - 1] == 0:
-                c = a[h.size - 1:]
-            else:
-                c = d[g.size - 1:]
+    for l in range(int(level), 0, -1):
+        if acoeff[l - 1] == 0:
+            c = _fir_decimate(c, np.atleast_2d(h).T, 2, work)[:, :, 0]
+            Lc = h.size
         else:
-            if acoeff[level - 1] == 0:
-                c1, c2, c3 = _TBFB(a, h1, h2, h3)
-            else:
-                c1, c2, c3 = _TBFB(d, h1, h2, h3)
-
-            if bcoeff == 0:
-                c = c1[h1.size - 1:]
-            elif bcoeff == 1:
-                c = c2[h2.size - 1:]
-            elif bcoeff == 2:
-                c = c3[h3.size - 1:]
+            c = _fir_decimate(c, np.atleast_2d(g).T, 2, work)[:, :, 0]
+            c[:, 0::2] *= -1
+            Lc = g.size
 
-    if level > 1:
-        if acoeff[level - 1] == 0:
-            c = K_wpQ_filt_local(a, h, g, h1, h2, h3, acoeff, bcoeff, level - 1)
-        else:
-            c = K_wpQ_filt_local(d, h, g, h1, h2, h3, acoeff, bcoeff, level - 1)
+    if bcoeff.size != 0:
+        hb = (h1, h2, h3)[int(bcoeff)]
+        c = _fir_decimate(c, np.atleast_2d(hb).T, 3, work)[:, :, 0]
+        Lc = hb.size
 
-    return c
\ No newline at end of file
+    return np.atleast_2d(c[0, Lc - 1:]).T.copy()
\ No newline at end of file
@@ -1,5 +1,4 @@
 import numpy as np
-from scipy.interpolate import interp1d
 
 # =========================================================================
 # This code is programmed by System Design Optimization Lab (SDOL) at Korea
@@ -17,36 +16,64 @@ from scipy.interpolate import interp1d
 
 def sdol_tsa(x,sr,tach,ppr,Nr=1):
 
-    t = np.arange(0, len(x) / sr, 1 / sr)
+    x = np.ravel(x, order='C')
+    idx, w, N, sr_resamp = tsa_plan(len(x), sr, tach, ppr, Nr)
+    resx = x[idx] * (1 - w) + x[idx + 1] * w                                     # Linear interpolation, nrev x N
+    ta = np.mean(resx, axis=0)
+    ta = np.reshape(ta,(len(ta),1))
+    t = range(N) / sr_resamp
+
+    return ta, t
+
+# ============================== Input ====================================
+# n: Length of the vibration signal
+# sr, tach, ppr, Nr: Same as sdol_tsa
+# ============================== Output ===================================
+# idx, w: (nrev x N) left sample index and weight of every angular resample
+#         point, x[idx]*(1-w) + x[idx+1]*w interpolates any signal of length n
+# N: Samples per revolution
+# sr_resamp: Sampling frequency of the TSA signal
+# =========================================================================
+
+def tsa_plan(n, sr, tach, ppr, Nr=1):
+
+    t = np.arange(0, n / sr, 1 / sr)
+    tach = np.ravel(tach)
     ppr = ppr*Nr
     if np.remainder(len(tach),ppr) == 0:
         nrev=int(len(tach)/ppr-1)
     else:
         nrev = int(np.floor(len(tach) / ppr))
 
-    T = np.empty(shape=[nrev, 1]) #cycle start time
+    T = np.append(tach[0], tach[ppr * np.arange(1, nrev + 1)])                   # Cycle start time
+    T = T[T < t[-1]]                                                              # Until maximum measurement time
 
-    for j in range(nrev):
-        T[j] = tach[ppr * (j + 1)]
+    dT = np.diff(T)
+    N = round(min(dT) * sr)
+    resample = T[:-1, None] + (dT / N)[:, None] * np.arange(N)                    # All revolution grids at once
+    # t is uniform: the left sample is floor(resample*sr), corrected by one for rounding of t
+    idx = np.clip(np.floor(resample * sr).astype(np.intp), 0, len(t) - 2)
+    idx -= (t[idx] > resample) & (idx > 0)
+    idx += (t[idx + 1] <= resample) & (idx < len(t) - 2)
+    w = (resample - t[idx]) / (t[idx + 1] - t[idx])
+    f = 1 / min(dT)
+    sr_resamp = N * f
+    return idx, w, N, sr_resamp
 
-    T = np.insert(T, 0, tach[0])
-    ind = np.where(T < t[-1]) #until maximum measurement time
-    T = T[ind]
+# ============================== Input ====================================
+# xs: Vibration signals sharing one tachometer signal, list or (files x n)
+# sr, tach, ppr, Nr: Same as sdol_tsa
+# ============================== Output ===================================
+# ta: (N x files) time synchronous averages, one column per signal
+# t: Sample time correspond to ta
+# =========================================================================
 
-    nrev = len(T) - 1;
-    N = round(min(np.diff(T)) * sr)
-    resample = np.empty(shape=[nrev, N])
-    for j in range(1, nrev + 1):
-        tmp = (T[j] - T[j - 1]) / N; tmp = tmp * range(N)
-        resample[j - 1, :] = T[j - 1] + tmp
+def sdol_tsa_batch(xs,sr,tach,ppr,Nr=1):
 
-    x = np.ravel(x, order='C')
-    resx = interp1d(t, x)(resample)
-    ta = np.mean(resx, axis=0)
-    ta = np.reshape(ta,(len(ta),1))
-    f = 1 / min(np.diff(T))
-    sr_resamp = N * f
+    X = np.vstack([np.ravel(x, order='C') for x in xs])
+    idx, w, N, sr_resamp = tsa_plan(X.shape[1], sr, tach, ppr, Nr)
+    resx = X[:, idx] * (1 - w) + X[:, idx + 1] * w                               # files x nrev x N
+    ta = np.mean(resx, axis=1).T
     t = range(N) / sr_resamp
-    
-    return ta, t
 
+    return ta, t